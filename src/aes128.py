@@ -1,12 +1,99 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from hashlib import sha256
+from hmac import compare_digest
+from itertools import repeat
+from mmap import ACCESS_READ, mmap
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count, fstat
+from struct import Struct, pack, unpack
 from typing import Generator
 from utils import Person
+import metrics
 
 
 class InvalidKeyBitCountError(Exception):
     pass
 
 
+class InvalidBlockLengthError(Exception):
+    pass
+
+
+class InvalidPaddingError(Exception):
+    pass
+
+
+class InvalidTagError(Exception):
+    pass
+
+
+_block = Struct(">4I")
+
+
+def _decrypt_shard(key: str, name: str, total: int, start: int, stop: int, iv: bytes):
+    """Runs in a worker, ciphertext sits at [0, total) of the shared memory and clear text goes to
+    [total, 2 * total)."""
+    memory = SharedMemory(name=name)
+
+    try:
+        chain = _block.unpack(iv) if start == 0 else _block.unpack_from(memory.buf, start - AES128.block_size)
+        AES128(key).cbc_decrypt_into(memory.buf[start:stop], memory.buf[total + start:total + stop], chain)
+    finally:
+        memory.close()
+
+
+def _ctr_shard(key: str, name: str, total: int, start: int, stop: int, nonce: bytes, offset: int):
+    memory = SharedMemory(name=name)
+
+    try:
+        AES128(key).ctr_crypt_into(memory.buf[start:stop], memory.buf[total + start:total + stop], nonce,
+                                   offset + start)
+    finally:
+        memory.close()
+
+
+_signer = {}
+
+
+def _init_signer(private_key: dict, public_key: dict):
+    """Pool initializer, every worker receives the key once instead of with every file."""
+    _signer["private_key"], _signer["public_key"] = private_key, public_key
+
+
+def _sign_file(path: str, keys: tuple[dict, dict] | None = None) -> list[int]:
+    private_key, public_key = keys or (_signer["private_key"], _signer["public_key"])
+
+    return RSA.sign_digest(RSA.hash_file(path), private_key, public_key)
+
+
+def _gmul(x: int, y: int) -> int:
+    result = 0
+
+    for _ in range(8):
+        if y & 1:
+            result ^= x
+        x <<= 1
+
+        if x & 0x100:
+            x ^= 0x11b
+
+        y >>= 1
+
+    return result
+
+
+def _round_tables(box: tuple, column: tuple) -> tuple[tuple[int], ...]:
+    """https://en.wikipedia.org/wiki/Advanced_Encryption_Standard#Optimization_of_the_cipher"""
+    t0 = tuple((_gmul(column[0], s) << 24) | (_gmul(column[1], s) << 16) | (_gmul(column[2], s) << 8) |
+               _gmul(column[3], s) for s in box)
+    t1 = tuple(((w >> 8) | (w << 24)) & 0xFFFFFFFF for w in t0)
+    t2 = tuple(((w >> 16) | (w << 16)) & 0xFFFFFFFF for w in t0)
+    t3 = tuple(((w >> 24) | (w << 8)) & 0xFFFFFFFF for w in t0)
+
+    return t0, t1, t2, t3
+
+
 class AES128:
     """https://en.wikipedia.org/wiki/Advanced_Encryption_Standard"""
     """https://gist.github.com/bonsaiviking/5571001"""
@@ -56,6 +143,24 @@ class AES128:
                         13, 9, 14, 11,
                         11, 13, 9, 14)
 
+    nb = 4
+    nr = 10
+    nk = 4
+
+    block_size = 16
+    zero_iv = bytes(block_size)
+
+    schedule_cache_size = 4096
+    ghash_cache_size = 32
+    parallel_threshold = 1 << 16
+    ctr_batch_blocks = 4096
+    gcm_tag_lengths = (12, 13, 14, 15, 16)
+
+    te0, te1, te2, te3 = _round_tables(s_box, fixed_matrix[0::4])
+    td0, td1, td2, td3 = _round_tables(inv_s_box, inv_fixed_matrix[0::4])
+
+    __slots__ = ("key", "state", "encryption_keys", "decryption_keys")
+
     def __init__(self, key: str):
         self.key = self.convert_hex_string_to_tuple(key)
 
@@ -63,10 +168,7 @@ class AES128:
             raise InvalidKeyBitCountError
 
         self.state = []
-
-        self.nb = 4
-        self.nr = 10
-        self.nk = 4
+        self.encryption_keys, self.decryption_keys = self.key_schedules(self.key)
 
     def __repr__(self):
         key = f"⌈ {hex(self.key[0])} {hex(self.key[4])} {hex(self.key[8])} {hex(self.key[12])} ⌉\n"
@@ -77,7 +179,7 @@ class AES128:
         return ''.join(char if char == 'x' else char.upper() for char in key)
 
     def encrypt(self, clear_text: str) -> str:
-        cipher_text = ""
+        cipher_text = []
         clear_text = ''.join([self.standardize_hex(hex(ord(hexa))) for hexa in clear_text])
 
         while len(clear_text) % 16:
@@ -89,38 +191,24 @@ class AES128:
             previous_block = ""
 
             if i > 0:
-                previous_block = self.int_list_to_hex_string(self.state)
-            cipher_text += self.encrypt_block(block, previous_block)
+                previous_block = cipher_text[i - 1]
+            cipher_text.append(self.encrypt_block(block, previous_block))
 
-        return cipher_text
+        return "".join(cipher_text)
 
     def encrypt_block(self, block: str, previous_cipher: str = "") -> str:
-        block = [block[i:i + 2] for i in range(0, len(block), 2)]
+        if metrics.enabled:
+            metrics.count("aes128.blocks.hex")
 
-        n = self.nb * 4
-        self.state = [int(char, 16) for char in block]
+        words = unpack(">4I", bytes.fromhex(block))
 
         if previous_cipher:
-            self.state = self.xor(self.convert_hex_string_to_tuple(previous_cipher), self.state)
-
-        keys = self.key_schedule()
-        self.add_round_key(keys[0:n])
+            words = self.xor(unpack(">4I", bytes.fromhex(previous_cipher)), words)
 
-        for r in range(1, self.nr):
-            self.sub_bytes()
-            self.shift_rows()
-            self.mix_columns()
-            k = keys[r * n:(r + 1) * n]
-            self.add_round_key(k)
-
-        self.sub_bytes()
-        self.shift_rows()
-        self.add_round_key(keys[self.nr * n:])
-
-        return self.int_list_to_hex_string(self.state)
+        return pack(">4I", *self.encrypt_words(*words, self.encryption_keys)).hex()
 
     def decrypt(self, cipher_text: str) -> str:
-        clear_text = ""
+        clear_text = []
         blocks = [cipher_text[i:i + 32] for i in range(0, len(cipher_text), 32)]
 
         for i, block in enumerate(blocks):
@@ -128,38 +216,457 @@ class AES128:
 
             if i > 0:
                 previous_block = blocks[i - 1]
-            clear_text += self.decrypt_block(block, previous_block)
+            clear_text.append(self.decrypt_block(block, previous_block))
 
-        return clear_text
+        return "".join(clear_text)
 
     def decrypt_block(self, block: str, previous_cipher: str = "") -> str:
-        block = [block[i:i + 2] for i in range(0, len(block), 2)]
+        if metrics.enabled:
+            metrics.count("aes128.blocks.hex")
 
-        n = self.nb * 4
-        self.state = [int(char, 16) for char in block]
+        words = self.decrypt_words(*unpack(">4I", bytes.fromhex(block)), self.decryption_keys)
 
-        keys = self.key_schedule()
-        k = keys[self.nr * n:(self.nr + 1) * n]
-        self.add_round_key(k)
+        if previous_cipher:
+            words = self.xor(unpack(">4I", bytes.fromhex(previous_cipher)), words)
 
-        for r in range(self.nr - 1, 0, -1):
-            self.inv_shift_rows()
-            self.inv_sub_bytes()
-            k = keys[r * n:(r + 1) * n]
-            self.add_round_key(k)
-            self.inv_mix_columns()
+        return "".join(map(chr, pack(">4I", *words).rstrip(b"\0")))
 
-        self.inv_shift_rows()
-        self.inv_sub_bytes()
-        self.add_round_key(keys[0:n])
+    def encrypt_bytes(self, clear_data, iv: bytes = zero_iv) -> bytearray:
+        """CBC with PKCS#7 padding over any buffer, only the last partial block is copied."""
+        view = memoryview(clear_data).cast("B")
+        n = len(view) - len(view) % self.block_size
+        cipher_data = bytearray(n + self.block_size)
 
-        if previous_cipher:
-            self.state = self.xor(self.convert_hex_string_to_tuple(previous_cipher), self.state)
+        chain = self.cbc_encrypt_into(view[:n], cipher_data, _block.unpack(iv))
+        self.cbc_encrypt_into(self.pad(view[n:]), memoryview(cipher_data)[n:], chain)
+
+        return cipher_data
+
+    def encrypt_many(self, messages, iv: bytes = zero_iv, executor: Executor | None = None) -> list[bytearray]:
+        """The keyed object is never written to while ciphering, so one instance serves every thread of the pool."""
+        return self.map_messages(self.encrypt_bytes, messages, iv, executor)
+
+    def decrypt_many(self, messages, iv: bytes = zero_iv, executor: Executor | None = None) -> list[bytearray]:
+        return self.map_messages(self.decrypt_bytes, messages, iv, executor)
+
+    @staticmethod
+    def map_messages(function, messages, iv: bytes, executor: Executor | None) -> list[bytearray]:
+        if executor is not None:
+            return list(executor.map(function, messages, repeat(iv)))
+
+        with ThreadPoolExecutor() as pool:
+            return list(pool.map(function, messages, repeat(iv)))
+
+    def encrypt_into(self, clear_data, cipher_data, iv: bytes = zero_iv) -> int:
+        """CBC without padding, clear_data must be a whole number of blocks and fit in cipher_data."""
+        view = self.block_view(clear_data, cipher_data)
+        self.cbc_encrypt_into(view, cipher_data, _block.unpack(iv))
+
+        return len(view)
+
+    def decrypt_bytes(self, cipher_data, iv: bytes = zero_iv) -> bytearray:
+        view = memoryview(cipher_data).cast("B")
+        clear_data = bytearray(len(view))
+        self.decrypt_into(view, clear_data, iv)
+        del clear_data[len(clear_data) - self.unpad_length(clear_data):]
+
+        return clear_data
+
+    def decrypt_into(self, cipher_data, clear_data, iv: bytes = zero_iv) -> int:
+        view = self.block_view(cipher_data, clear_data)
+        self.cbc_decrypt_into(view, clear_data, _block.unpack(iv))
+
+        return len(view)
+
+    def decrypt_parallel(self, cipher_data, iv: bytes = zero_iv, workers: int | None = None,
+                         executor: Executor | None = None) -> bytearray:
+        """CBC decryption only chains on ciphertext, so block ranges are decrypted independently by a process pool
+        through shared memory. Pass a long-lived executor to avoid starting processes on every call."""
+        view = memoryview(cipher_data).cast("B")
+        total = len(view)
+        workers = workers or cpu_count() or 1
+
+        if total < self.parallel_threshold or (workers == 1 and executor is None):
+            return self.decrypt_bytes(view, iv)
+        if total % self.block_size:
+            raise InvalidBlockLengthError
+
+        clear_data = self.run_shards(_decrypt_shard, view, workers, executor, iv)
+        del clear_data[len(clear_data) - self.unpad_length(clear_data):]
+
+        return clear_data
+
+    def ecb_encrypt(self, clear_data) -> bytearray:
+        """Independent blocks without padding, clear_data must be a whole number of blocks."""
+        view = self.block_view(clear_data, clear_data)
+        cipher_data = bytearray(len(view))
+
+        if metrics.enabled:
+            metrics.count("aes128.blocks.ecb", len(view) // self.block_size)
+
+        unpack_from, pack_into, encrypt_words, keys = _block.unpack_from, _block.pack_into, self.encrypt_words, \
+            self.encryption_keys
+
+        for i in range(0, len(view), self.block_size):
+            pack_into(cipher_data, i, *encrypt_words(*unpack_from(view, i), keys))
+
+        return cipher_data
+
+    def ecb_decrypt(self, cipher_data) -> bytearray:
+        view = self.block_view(cipher_data, cipher_data)
+        clear_data = bytearray(len(view))
+
+        if metrics.enabled:
+            metrics.count("aes128.blocks.ecb", len(view) // self.block_size)
+
+        unpack_from, pack_into, decrypt_words, keys = _block.unpack_from, _block.pack_into, self.decrypt_words, \
+            self.decryption_keys
+
+        for i in range(0, len(view), self.block_size):
+            pack_into(clear_data, i, *decrypt_words(*unpack_from(view, i), keys))
+
+        return clear_data
+
+    def ctr_crypt(self, data, nonce: bytes, offset: int = 0) -> bytearray:
+        """https://en.wikipedia.org/wiki/Block_cipher_mode_of_operation#Counter_(CTR)
+        The counter block is the nonce padded with zeros to 128 bits and offset is the position of data in the
+        stream, so any range of a message can be processed on its own."""
+        view = memoryview(data).cast("B")
+        out = bytearray(len(view))
+        self.ctr_crypt_into(view, out, nonce, offset)
+
+        return out
+
+    def ctr_crypt_into(self, data, out, nonce: bytes, offset: int = 0) -> int:
+        view = memoryview(data).cast("B")
+        n = len(view)
+
+        if len(out) < n:
+            raise InvalidBlockLengthError
+
+        counter = self.initial_counter(nonce) + offset // self.block_size
+        self.ctr_xor_into(view, out, counter, offset % self.block_size)
+
+        return n
+
+    def ctr_xor_into(self, view: memoryview, out, counter: int, skip: int = 0, width: int = 128):
+        """XORs view with the keystream starting skip bytes into the block of counter, only the low width bits of the
+        counter are incremented."""
+        if metrics.enabled:
+            metrics.count("aes128.blocks.ctr", -(-(skip + len(view)) // self.block_size))
+
+        batch = self.ctr_batch_blocks * self.block_size
+        keystream = bytearray(batch)
+        key_view = memoryview(keystream)
+        mask = (1 << width) - 1
+        fixed = counter & ~mask
+        position = 0
+
+        while position < len(view):
+            size = min(batch - skip, len(view) - position)
+            blocks = -(-(skip + size) // self.block_size)
+            self.ctr_keystream_into(keystream, counter, blocks, width)
+            chunk = int.from_bytes(view[position:position + size], "big") ^ \
+                int.from_bytes(key_view[skip:skip + size], "big")
+            out[position:position + size] = chunk.to_bytes(size, "big")
+            position += size
+            counter = fixed | (counter + blocks) & mask
+            skip = 0
+
+    def ctr_keystream_into(self, out, counter: int, blocks: int, width: int = 128):
+        pack_into, encrypt_words, keys = _block.pack_into, self.encrypt_words, self.encryption_keys
+        mask = (1 << width) - 1
+        fixed = counter & ~mask & 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF
+
+        for i in range(blocks):
+            c = fixed | (counter + i) & mask
+            pack_into(out, i * self.block_size,
+                      *encrypt_words(c >> 96, (c >> 64) & 0xFFFFFFFF, (c >> 32) & 0xFFFFFFFF, c & 0xFFFFFFFF, keys))
+
+    def gcm_encrypt(self, clear_data, iv: bytes, associated_data=b"") -> tuple[bytearray, bytes]:
+        """https://nvlpubs.nist.gov/nistpubs/Legacy/SP/nistspecialpublication800-38d.pdf"""
+        view = memoryview(clear_data).cast("B")
+        cipher_data = bytearray(len(view))
+        j0 = self.gcm_j0(iv)
+        self.ctr_xor_into(view, cipher_data, self.gcm_inc32(j0), width=32)
+
+        return cipher_data, self.gcm_tag(j0, associated_data, cipher_data)
+
+    def gcm_decrypt(self, cipher_data, iv: bytes, tag: bytes, associated_data=b"") -> bytearray:
+        view = memoryview(cipher_data).cast("B")
+        j0 = self.gcm_j0(iv)
+
+        if len(tag) not in self.gcm_tag_lengths:
+            raise InvalidTagError
+        if not compare_digest(self.gcm_tag(j0, associated_data, view)[:len(tag)], tag):
+            raise InvalidTagError
+
+        clear_data = bytearray(len(view))
+        self.ctr_xor_into(view, clear_data, self.gcm_inc32(j0), width=32)
+
+        return clear_data
+
+    def gcm_j0(self, iv: bytes) -> int:
+        if not len(iv):
+            raise InvalidBlockLengthError
+        if len(iv) == 12:
+            return int.from_bytes(iv, "big") << 32 | 1
+
+        return self.ghash(b"", iv)
+
+    @staticmethod
+    def gcm_inc32(counter: int) -> int:
+        return counter & ~0xFFFFFFFF | (counter + 1) & 0xFFFFFFFF
+
+    def gcm_tag(self, j0: int, associated_data, cipher_data) -> bytes:
+        s = self.ghash(associated_data, cipher_data)
+        mask = pack(">4I", *self.encrypt_words(*_block.unpack(j0.to_bytes(16, "big")), self.encryption_keys))
+
+        return (s ^ int.from_bytes(mask, "big")).to_bytes(16, "big")
+
+    def ghash(self, associated_data, cipher_data) -> int:
+        """Both inputs are zero padded to whole blocks and followed by their bit lengths."""
+        tables = self.ghash_tables(self.key)
+        y = 0
 
-        while not self.state[-1]:
-            self.state.pop(-1)
+        if metrics.enabled:
+            metrics.count("aes128.blocks.ghash", sum(-(-len(memoryview(data).cast("B")) // self.block_size)
+                                                     for data in (associated_data, cipher_data)) + 1)
 
-        return "".join(map(chr, self.state))
+        for data in (memoryview(associated_data).cast("B"), memoryview(cipher_data).cast("B")):
+            for i in range(0, len(data), self.block_size):
+                block = data[i:i + self.block_size]
+                y ^= int.from_bytes(block, "big") << 8 * (self.block_size - len(block))
+                y = self.gf_mul(y, tables)
+
+        y ^= len(memoryview(associated_data).cast("B")) * 8 << 64 | len(memoryview(cipher_data).cast("B")) * 8
+
+        return self.gf_mul(y, tables)
+
+    @staticmethod
+    def gf_mul(x: int, tables: tuple[list[int], ...]) -> int:
+        y = 0
+
+        for table, b in zip(tables, x.to_bytes(16, "big")):
+            y ^= table[b]
+
+        return y
+
+    @classmethod
+    @lru_cache(maxsize=ghash_cache_size)
+    def ghash_tables(cls, key: tuple[int]) -> tuple[list[int], ...]:
+        """Multiples of H for every value of every input byte, so a GF(2^128) product is 16 lookups without any
+        reduction step. https://www.cryptologie.net/article/277/shoup-tables-for-ghash/
+        About 200 KB per key, hence a cache much smaller than the key schedule one."""
+        h = int.from_bytes(pack(">4I", *cls.encrypt_words(0, 0, 0, 0, cls.key_schedules(key)[0])), "big")
+        powers = []
+
+        for _ in range(128):
+            powers.append(h)
+            h = h >> 1 ^ (0xE1 << 120 if h & 1 else 0)
+
+        tables = []
+
+        for i in range(16):
+            table = [0] * 256
+
+            for m in range(8):
+                bit, value = 1 << m, powers[8 * i + 7 - m]
+
+                for b in range(bit):
+                    table[bit | b] = table[b] ^ value
+
+            tables.append(table)
+
+        return tuple(tables)
+
+    def ctr_crypt_parallel(self, data, nonce: bytes, offset: int = 0, workers: int | None = None,
+                           executor: Executor | None = None) -> bytearray:
+        view = memoryview(data).cast("B")
+        workers = workers or cpu_count() or 1
+
+        if len(view) < self.parallel_threshold or (workers == 1 and executor is None):
+            return self.ctr_crypt(view, nonce, offset)
+
+        return self.run_shards(_ctr_shard, view, workers, executor, nonce, offset)
+
+    @classmethod
+    def initial_counter(cls, nonce: bytes) -> int:
+        if len(nonce) > cls.block_size:
+            raise InvalidBlockLengthError
+
+        return int.from_bytes(bytes(nonce).ljust(cls.block_size, b"\0"), "big")
+
+    def run_shards(self, task, view: memoryview, workers: int, executor: Executor | None, *args) -> bytearray:
+        """Copies view to the front of a shared memory segment and lets task fill the back half, shard by shard."""
+        total = len(view)
+        blocks = -(-total // self.block_size)
+        step = max(-(-blocks // (workers * 4)), 1) * self.block_size
+        memory = SharedMemory(create=True, size=2 * total)
+
+        try:
+            memory.buf[:total] = view
+            pool = executor or ProcessPoolExecutor(workers)
+
+            try:
+                key = bytes(self.key).hex()
+                futures = [pool.submit(task, key, memory.name, total, start, min(start + step, total), *args)
+                           for start in range(0, total, step)]
+
+                for future in futures:
+                    future.result()
+            finally:
+                if executor is None:
+                    pool.shutdown()
+
+            return bytearray(memory.buf[total:2 * total])
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def block_view(self, data, out) -> memoryview:
+        view = memoryview(data).cast("B")
+
+        if len(view) % self.block_size:
+            raise InvalidBlockLengthError
+        if len(out) < len(view):
+            raise InvalidBlockLengthError
+
+        return view
+
+    def cbc_encrypt_into(self, view, out, chain: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """Encrypts the whole blocks of view into out and returns the last cipher block as the next chain."""
+        if metrics.enabled:
+            metrics.count("aes128.blocks.cbc", len(view) // self.block_size)
+
+        unpack_from, pack_into, encrypt_words, keys = _block.unpack_from, _block.pack_into, self.encrypt_words, \
+            self.encryption_keys
+        c0, c1, c2, c3 = chain
+
+        for i in range(0, len(view), self.block_size):
+            p0, p1, p2, p3 = unpack_from(view, i)
+            c0, c1, c2, c3 = encrypt_words(p0 ^ c0, p1 ^ c1, p2 ^ c2, p3 ^ c3, keys)
+            pack_into(out, i, c0, c1, c2, c3)
+
+        return c0, c1, c2, c3
+
+    def cbc_decrypt_into(self, view, out, chain: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        if metrics.enabled:
+            metrics.count("aes128.blocks.cbc", len(view) // self.block_size)
+
+        unpack_from, pack_into, decrypt_words, keys = _block.unpack_from, _block.pack_into, self.decrypt_words, \
+            self.decryption_keys
+        c0, c1, c2, c3 = chain
+
+        for i in range(0, len(view), self.block_size):
+            words = unpack_from(view, i)
+            p0, p1, p2, p3 = decrypt_words(*words, keys)
+            pack_into(out, i, p0 ^ c0, p1 ^ c1, p2 ^ c2, p3 ^ c3)
+            c0, c1, c2, c3 = words
+
+        return c0, c1, c2, c3
+
+    @classmethod
+    def pad(cls, tail) -> bytes:
+        """https://en.wikipedia.org/wiki/Padding_(cryptography)#PKCS#5_and_PKCS#7"""
+        n = cls.block_size - len(tail) % cls.block_size
+
+        return bytes(tail) + bytes((n,)) * n
+
+    @classmethod
+    def unpad_length(cls, data) -> int:
+        n = data[-1] if len(data) else 0
+
+        if not 0 < n <= cls.block_size or any(b != n for b in data[len(data) - n:]):
+            raise InvalidPaddingError
+
+        return n
+
+    def encryptor(self, iv: bytes = zero_iv) -> "CBCEncryptor":
+        return CBCEncryptor(self, iv)
+
+    def decryptor(self, iv: bytes = zero_iv) -> "CBCDecryptor":
+        return CBCDecryptor(self, iv)
+
+    def encrypt_stream(self, reader, writer, chunk_size: int = 1 << 16, iv: bytes = zero_iv) -> int:
+        return self.pipe(self.encryptor(iv), reader, writer, chunk_size)
+
+    def decrypt_stream(self, reader, writer, chunk_size: int = 1 << 16, iv: bytes = zero_iv) -> int:
+        return self.pipe(self.decryptor(iv), reader, writer, chunk_size)
+
+    @classmethod
+    def pipe(cls, context, reader, writer, chunk_size: int) -> int:
+        written = 0
+
+        for chunk in cls.read_chunks(reader, chunk_size):
+            written += writer.write(context.update(chunk))
+
+        return written + writer.write(context.finalize())
+
+    @staticmethod
+    def read_chunks(reader, chunk_size: int) -> Generator[memoryview, None, None]:
+        """Reuses a single buffer, each chunk is only valid until the next one is requested."""
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+
+        while n := reader.readinto(buffer):
+            yield view[:n]
+
+    @classmethod
+    def encrypt_words(cls, s0: int, s1: int, s2: int, s3: int, keys: tuple[int]) -> tuple[int, int, int, int]:
+        """Full rounds as T-table lookups on the four big-endian column words of the state."""
+        te0, te1, te2, te3, box = cls.te0, cls.te1, cls.te2, cls.te3, cls.s_box
+
+        s0 ^= keys[0]
+        s1 ^= keys[1]
+        s2 ^= keys[2]
+        s3 ^= keys[3]
+
+        for k in range(4, cls.nr * 4, 4):
+            s0, s1, s2, s3 = (
+                te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ keys[k],
+                te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ keys[k + 1],
+                te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ keys[k + 2],
+                te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ keys[k + 3])
+
+        k = cls.nr * 4
+
+        return ((box[s0 >> 24] << 24 | box[(s1 >> 16) & 0xFF] << 16 | box[(s2 >> 8) & 0xFF] << 8 |
+                 box[s3 & 0xFF]) ^ keys[k],
+                (box[s1 >> 24] << 24 | box[(s2 >> 16) & 0xFF] << 16 | box[(s3 >> 8) & 0xFF] << 8 |
+                 box[s0 & 0xFF]) ^ keys[k + 1],
+                (box[s2 >> 24] << 24 | box[(s3 >> 16) & 0xFF] << 16 | box[(s0 >> 8) & 0xFF] << 8 |
+                 box[s1 & 0xFF]) ^ keys[k + 2],
+                (box[s3 >> 24] << 24 | box[(s0 >> 16) & 0xFF] << 16 | box[(s1 >> 8) & 0xFF] << 8 |
+                 box[s2 & 0xFF]) ^ keys[k + 3])
+
+    @classmethod
+    def decrypt_words(cls, s0: int, s1: int, s2: int, s3: int, keys: tuple[int]) -> tuple[int, int, int, int]:
+        """Equivalent inverse cipher, expects the decryption keys returned by key_schedules."""
+        td0, td1, td2, td3, box = cls.td0, cls.td1, cls.td2, cls.td3, cls.inv_s_box
+
+        s0 ^= keys[0]
+        s1 ^= keys[1]
+        s2 ^= keys[2]
+        s3 ^= keys[3]
+
+        for k in range(4, cls.nr * 4, 4):
+            s0, s1, s2, s3 = (
+                td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ keys[k],
+                td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ keys[k + 1],
+                td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ keys[k + 2],
+                td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ keys[k + 3])
+
+        k = cls.nr * 4
+
+        return ((box[s0 >> 24] << 24 | box[(s3 >> 16) & 0xFF] << 16 | box[(s2 >> 8) & 0xFF] << 8 |
+                 box[s1 & 0xFF]) ^ keys[k],
+                (box[s1 >> 24] << 24 | box[(s0 >> 16) & 0xFF] << 16 | box[(s3 >> 8) & 0xFF] << 8 |
+                 box[s2 & 0xFF]) ^ keys[k + 1],
+                (box[s2 >> 24] << 24 | box[(s1 >> 16) & 0xFF] << 16 | box[(s0 >> 8) & 0xFF] << 8 |
+                 box[s3 & 0xFF]) ^ keys[k + 2],
+                (box[s3 >> 24] << 24 | box[(s2 >> 16) & 0xFF] << 16 | box[(s1 >> 8) & 0xFF] << 8 |
+                 box[s0 & 0xFF]) ^ keys[k + 3])
 
     @staticmethod
     def standardize_hex(hexa: str) -> str:
@@ -169,14 +676,10 @@ class AES128:
             return hexa[2:]
 
     def int_list_to_hex_string(self, int_list: list[int]) -> str:
-        hex_string = ""
-
-        for e in int_list:
-            hex_string += self.standardize_hex(hex(e))
-
-        return hex_string
+        return "".join([self.standardize_hex(hex(e)) for e in int_list])
 
     @staticmethod
+    @lru_cache(maxsize=schedule_cache_size)
     def convert_hex_string_to_tuple(hex_str: str) -> tuple[int]:
         hex_list = [hex_str.replace(" ", "")[i:i + 2] for i in range(0, len(hex_str.replace(" ", "")), 2)]
 
@@ -190,25 +693,54 @@ class AES128:
     def rot_word(word: list) -> list:
         return word[1:] + word[:1]
 
-    def sub_word(self, word: list) -> Generator[int, int, None]:
-        return (self.s_box[b] for b in word)
+    @classmethod
+    def sub_word(cls, word: list) -> Generator[int, int, None]:
+        return (cls.s_box[b] for b in word)
 
     def key_schedule(self):
+        return self.expand_key(self.key)
+
+    @classmethod
+    def expand_key(cls, key: tuple[int]) -> list[int]:
         expanded_key = []
-        expanded_key.extend(self.key)
+        expanded_key.extend(key)
 
-        for i in range(self.nk, self.nb * (self.nr + 1)):
+        for i in range(cls.nk, cls.nb * (cls.nr + 1)):
             tmp = expanded_key[(i - 1) * 4:i * 4]
 
-            if i % self.nk == 0:
-                tmp = self.xor(self.sub_word(self.rot_word(tmp)), (self.round_constant[i // self.nk], 0, 0, 0))
-            elif self.nk > 6 and i % self.nk == 4:
-                tmp = self.sub_word(tmp)
+            if i % cls.nk == 0:
+                tmp = cls.xor(cls.sub_word(cls.rot_word(tmp)), (cls.round_constant[i // cls.nk], 0, 0, 0))
+            elif cls.nk > 6 and i % cls.nk == 4:
+                tmp = cls.sub_word(tmp)
 
-            expanded_key.extend(self.xor(tmp, expanded_key[(i - self.nk) * 4:(i - self.nk + 1) * 4]))
+            expanded_key.extend(cls.xor(tmp, expanded_key[(i - cls.nk) * 4:(i - cls.nk + 1) * 4]))
 
         return expanded_key
 
+    @classmethod
+    @lru_cache(maxsize=schedule_cache_size)
+    @metrics.timed("aes128.key_expansion")
+    def key_schedules(cls, key: tuple[int]) -> tuple[tuple[int], tuple[int]]:
+        """Encryption and equivalent inverse cipher round keys as words, shared by every instance using the key."""
+        keys = unpack(f">{cls.nb * (cls.nr + 1)}I", bytes(cls.expand_key(key)))
+
+        return keys, cls.inv_round_keys(keys)
+
+    @classmethod
+    def inv_round_keys(cls, keys: tuple[int]) -> tuple[int]:
+        """https://en.wikipedia.org/wiki/AES_key_schedule#The_equivalent_inverse_cipher"""
+        td0, td1, td2, td3, box = cls.td0, cls.td1, cls.td2, cls.td3, cls.s_box
+        n = cls.nr * 4
+        inv_keys = list(keys[n:n + 4])
+
+        for k in range(n - 4, 0, -4):
+            inv_keys.extend(td0[box[w >> 24]] ^ td1[box[(w >> 16) & 0xFF]] ^ td2[box[(w >> 8) & 0xFF]] ^
+                            td3[box[w & 0xFF]] for w in keys[k:k + 4])
+
+        inv_keys.extend(keys[0:4])
+
+        return tuple(inv_keys)
+
     @staticmethod
     def index_from_hex(hexa: int) -> tuple[int, int]:
         return hexa // 16, hexa % 16
@@ -248,21 +780,7 @@ class AES128:
             for _ in range(row):
                 self.inv_shift_a_row_left(row)
 
-    @staticmethod
-    def gmul(x: int, y: int) -> int:
-        result = 0
-
-        for _ in range(8):
-            if y & 1:
-                result ^= x
-            x <<= 1
-
-            if x & 0x100:
-                x ^= 0x11b
-
-            y >>= 1
-
-        return result
+    gmul = staticmethod(_gmul)
 
     def mix_columns(self):
         """https://en.wikipedia.org/wiki/Rijndael_MixColumns"""
@@ -300,6 +818,87 @@ class AES128:
             self.state[i] = e ^ self.state[i]
 
 
+class CBCEncryptor:
+    __slots__ = ("cipher", "chain", "pending")
+
+    def __init__(self, cipher: AES128, iv: bytes = AES128.zero_iv):
+        self.cipher = cipher
+        self.chain = _block.unpack(iv)
+        self.pending = bytearray()
+
+    def update(self, chunk) -> bytearray:
+        view = memoryview(chunk).cast("B")
+        size = self.cipher.block_size
+        n = (len(self.pending) + len(view)) // size * size
+        cipher_data = bytearray(n)
+
+        if n and self.pending:
+            head = size - len(self.pending)
+            self.pending += view[:head]
+            self.chain = self.cipher.cbc_encrypt_into(self.pending, cipher_data, self.chain)
+            self.pending.clear()
+            view = view[head:]
+            self.chain = self.cipher.cbc_encrypt_into(view[:n - size], memoryview(cipher_data)[size:], self.chain)
+            self.pending += view[n - size:]
+        elif n:
+            self.chain = self.cipher.cbc_encrypt_into(view[:n], cipher_data, self.chain)
+            self.pending += view[n:]
+        else:
+            self.pending += view
+
+        return cipher_data
+
+    def finalize(self) -> bytearray:
+        cipher_data = bytearray(self.cipher.block_size)
+        self.chain = self.cipher.cbc_encrypt_into(self.cipher.pad(self.pending), cipher_data, self.chain)
+        self.pending.clear()
+
+        return cipher_data
+
+
+class CBCDecryptor:
+    """Always holds the last complete block back, finalize strips its padding."""
+    __slots__ = ("cipher", "chain", "pending")
+
+    def __init__(self, cipher: AES128, iv: bytes = AES128.zero_iv):
+        self.cipher = cipher
+        self.chain = _block.unpack(iv)
+        self.pending = bytearray()
+
+    def update(self, chunk) -> bytearray:
+        view = memoryview(chunk).cast("B")
+        size = self.cipher.block_size
+        n = max((len(self.pending) + len(view) - 1) // size * size, 0)
+        clear_data = bytearray(n)
+
+        if n and self.pending:
+            head = size - len(self.pending)
+            self.pending += view[:head]
+            self.chain = self.cipher.cbc_decrypt_into(self.pending, clear_data, self.chain)
+            self.pending.clear()
+            view = view[head:]
+            self.chain = self.cipher.cbc_decrypt_into(view[:n - size], memoryview(clear_data)[size:], self.chain)
+            self.pending += view[n - size:]
+        elif n:
+            self.chain = self.cipher.cbc_decrypt_into(view[:n], clear_data, self.chain)
+            self.pending += view[n:]
+        else:
+            self.pending += view
+
+        return clear_data
+
+    def finalize(self) -> bytearray:
+        if len(self.pending) != self.cipher.block_size:
+            raise InvalidBlockLengthError
+
+        clear_data = bytearray(self.cipher.block_size)
+        self.chain = self.cipher.cbc_decrypt_into(self.pending, clear_data, self.chain)
+        self.pending.clear()
+        del clear_data[len(clear_data) - self.cipher.unpad_length(clear_data):]
+
+        return clear_data
+
+
 class RSA:
     def __init__(self, message_to_crypt):
         self.message_to_crypt = message_to_crypt
@@ -309,23 +908,86 @@ class RSA:
         return str(self.encrypted_message).replace(" ", "").replace("'", "")[1:-1]
 
     def encrypt(self, person: Person):
-        sha = sha256(self.message_to_crypt.encode()).hexdigest()
-        decimal = self.hex_lst_to_dec_lst(self.split(sha))
-        self.encrypted_message = self.rsa_cipher(decimal, person.private_key["d"], person.public_key["n"])
+        digest = sha256(self.message_to_crypt.encode()).digest()
+        self.encrypted_message = self.sign_digest(digest, person.private_key, person.public_key)
+
+    @classmethod
+    def sign_file(cls, path: str, person: Person) -> list[int]:
+        return cls.sign_digest(cls.hash_file(path), person.private_key, person.public_key)
+
+    @classmethod
+    def sign_files(cls, paths, person: Person, workers: int | None = None,
+                   executor: Executor | None = None) -> list[list[int]]:
+        """Signs every file on a process pool whose workers get the key once. A long-lived executor passed in
+        receives the key with every file instead."""
+        keys = (dict(person.private_key), dict(person.public_key))
+        paths = list(paths)
+
+        if executor is not None:
+            return list(executor.map(_sign_file, paths, repeat(keys)))
+
+        workers = workers or cpu_count() or 1
+
+        if workers == 1 or len(paths) < 2:
+            return [_sign_file(path, keys) for path in paths]
+
+        with ProcessPoolExecutor(workers, initializer=_init_signer, initargs=keys) as pool:
+            return list(pool.map(_sign_file, paths, chunksize=max(len(paths) // (workers * 4), 1)))
 
     @staticmethod
-    def fast_modular_exponentiation(b, exp, mod):
-        """https://stackoverflow.com/questions/57668289/implement-the-function-fast-modular-exponentiation"""
-        result = 1
+    def hash_file(path: str, chunk_size: int = 1 << 20) -> bytes:
+        """Maps the file instead of reading it so the hash runs over the page cache without a copy, reads in chunks
+        what cannot be mapped, like pipes."""
+        digest = sha256()
+
+        with open(path, "rb") as file:
+            try:
+                if fstat(file.fileno()).st_size:
+                    with mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+                        digest.update(mapped)
 
-        while exp > 1:
-            if exp & 1:
-                result = (result * b) % mod
+                    return digest.digest()
+            except (OSError, ValueError):
+                pass
 
-            b = b ** 2 % mod
-            exp >>= 1
+            while chunk := file.read(chunk_size):
+                digest.update(chunk)
 
-        return (b * result) % mod
+        return digest.digest()
+
+    @classmethod
+    def sign_digest(cls, digest: bytes, private_key: dict, public_key: dict) -> list[int]:
+        blocks = cls.digest_blocks(digest)
+
+        if "q_inv" in private_key:
+            return [cls.crt_exponentiation(block, private_key) for block in blocks]
+
+        return [pow(block, private_key["d"], public_key["n"]) for block in blocks]
+
+    @staticmethod
+    def digest_blocks(digest: bytes, bits: int = 24) -> list[int]:
+        """Same blocks as hex_lst_to_dec_lst(split(hexdigest)): the digest is padded with zero bits to a multiple of
+        bits and cut from the most significant end."""
+        size = len(digest) * 8
+        padding = -size % bits
+        value = int.from_bytes(digest, "big") << padding
+        mask = (1 << bits) - 1
+
+        return [value >> shift & mask for shift in range(size + padding - bits, -1, -bits)]
+
+    @staticmethod
+    def fast_modular_exponentiation(b, exp, mod):
+        return pow(b, exp, mod)
+
+    @staticmethod
+    def crt_exponentiation(b, key: dict) -> int:
+        """https://en.wikipedia.org/wiki/RSA_(cryptosystem)#Using_the_Chinese_remainder_algorithm
+        Two half size exponentiations recombined with Garner's formula."""
+        p, q = key["p"], key["q"]
+        m1 = pow(b, key["dp"], p)
+        m2 = pow(b, key["dq"], q)
+
+        return m2 + (key["q_inv"] * (m1 - m2) % p) * q
 
     @staticmethod
     def split(block_str: str) -> list[str]:
@@ -0,0 +1,132 @@
+import numpy as np
+from struct import pack
+from aes128 import AES128, InvalidBlockLengthError
+
+
+class BatchAES128:
+    """AES128 over an (N, 16) uint8 array of blocks, every step being a single NumPy operation for the whole batch.
+    Bytes keep the column-major order of AES128.state."""
+    s_box = np.array(AES128.s_box, dtype=np.uint8)
+    inv_s_box = np.array(AES128.inv_s_box, dtype=np.uint8)
+
+    shift = np.array([row + 4 * ((column + row) % 4) for column in range(4) for row in range(4)])
+    inv_shift = np.array([row + 4 * ((column - row) % 4) for column in range(4) for row in range(4)])
+
+    batch_blocks = 1 << 16
+
+    def __init__(self, cipher: AES128):
+        self.cipher = cipher
+        self.round_keys = np.frombuffer(pack(f">{len(cipher.encryption_keys)}I", *cipher.encryption_keys),
+                                        dtype=np.uint8).reshape(-1, 16)
+
+    @staticmethod
+    def xtime(x: np.ndarray) -> np.ndarray:
+        return (x << 1) ^ ((x >> 7) * np.uint8(0x1b))
+
+    @classmethod
+    def mix_columns(cls, state: np.ndarray) -> np.ndarray:
+        """https://en.wikipedia.org/wiki/Rijndael_MixColumns#Implementation_example"""
+        a = state.reshape(-1, 4, 4)
+        a0, a1, a2, a3 = a[:, :, 0], a[:, :, 1], a[:, :, 2], a[:, :, 3]
+        t = a0 ^ a1 ^ a2 ^ a3
+        mixed = np.empty_like(a)
+        mixed[:, :, 0] = a0 ^ t ^ cls.xtime(a0 ^ a1)
+        mixed[:, :, 1] = a1 ^ t ^ cls.xtime(a1 ^ a2)
+        mixed[:, :, 2] = a2 ^ t ^ cls.xtime(a2 ^ a3)
+        mixed[:, :, 3] = a3 ^ t ^ cls.xtime(a3 ^ a0)
+
+        return mixed.reshape(-1, 16)
+
+    @classmethod
+    def inv_mix_columns(cls, state: np.ndarray) -> np.ndarray:
+        a = state.reshape(-1, 4, 4).copy()
+        u = cls.xtime(cls.xtime(a[:, :, 0] ^ a[:, :, 2]))
+        v = cls.xtime(cls.xtime(a[:, :, 1] ^ a[:, :, 3]))
+        a[:, :, 0] ^= u
+        a[:, :, 1] ^= v
+        a[:, :, 2] ^= u
+        a[:, :, 3] ^= v
+
+        return cls.mix_columns(a)
+
+    def encrypt_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        keys, nr = self.round_keys, self.cipher.nr
+        state = blocks ^ keys[0]
+
+        for r in range(1, nr):
+            state = self.mix_columns(self.s_box[state[:, self.shift]]) ^ keys[r]
+
+        return self.s_box[state[:, self.shift]] ^ keys[nr]
+
+    def decrypt_blocks(self, blocks: np.ndarray) -> np.ndarray:
+        keys, nr = self.round_keys, self.cipher.nr
+        state = blocks ^ keys[nr]
+
+        for r in range(nr - 1, 0, -1):
+            state = self.inv_mix_columns(self.inv_s_box[state[:, self.inv_shift]] ^ keys[r])
+
+        return self.inv_s_box[state[:, self.inv_shift]] ^ keys[0]
+
+    def blocks(self, data) -> np.ndarray:
+        view = memoryview(data).cast("B")
+
+        if len(view) % self.cipher.block_size:
+            raise InvalidBlockLengthError
+
+        return np.frombuffer(view, dtype=np.uint8).reshape(-1, 16)
+
+    def ecb_encrypt(self, clear_data) -> bytearray:
+        return self.apply(self.encrypt_blocks, self.blocks(clear_data))
+
+    def ecb_decrypt(self, cipher_data) -> bytearray:
+        return self.apply(self.decrypt_blocks, self.blocks(cipher_data))
+
+    def apply(self, engine, blocks: np.ndarray) -> bytearray:
+        out = bytearray(blocks.size)
+        result = np.frombuffer(out, dtype=np.uint8).reshape(-1, 16)
+
+        for i in range(0, len(blocks), self.batch_blocks):
+            result[i:i + self.batch_blocks] = engine(blocks[i:i + self.batch_blocks])
+
+        return out
+
+    def cbc_decrypt(self, cipher_data, iv: bytes = AES128.zero_iv) -> bytearray:
+        blocks = self.blocks(cipher_data)
+        clear_data = self.apply(self.decrypt_blocks, blocks)
+        result = np.frombuffer(clear_data, dtype=np.uint8).reshape(-1, 16)
+
+        if len(blocks):
+            result[0] ^= np.frombuffer(iv, dtype=np.uint8)
+            result[1:] ^= blocks[:-1]
+
+        del result
+        del clear_data[len(clear_data) - self.cipher.unpad_length(clear_data):]
+
+        return clear_data
+
+    def counter_blocks(self, counter: int, n: int) -> np.ndarray:
+        """128-bit big-endian counters built from two uint64 halves, the low half carrying into the high one."""
+        low = np.arange(n, dtype=np.uint64) + np.uint64(counter & 0xFFFFFFFFFFFFFFFF)
+        high = np.uint64(counter >> 64 & 0xFFFFFFFFFFFFFFFF) + (low < np.uint64(counter & 0xFFFFFFFFFFFFFFFF))
+
+        return np.stack([high, low], axis=1).astype(">u8").view(np.uint8).reshape(-1, 16)
+
+    def ctr_crypt(self, data, nonce: bytes, offset: int = 0) -> bytearray:
+        view = np.frombuffer(memoryview(data).cast("B"), dtype=np.uint8)
+        out = bytearray(len(view))
+        result = np.frombuffer(out, dtype=np.uint8)
+        size = self.cipher.block_size
+        counter = self.cipher.initial_counter(nonce) + offset // size
+        skip = offset % size
+        position = 0
+
+        while position < len(view):
+            n = min(self.batch_blocks * size - skip, len(view) - position)
+            blocks = -(-(skip + n) // size)
+            keystream = self.encrypt_blocks(self.counter_blocks(counter, blocks)).reshape(-1)
+            result[position:position + n] = view[position:position + n] ^ keystream[skip:skip + n]
+            position += n
+            counter += blocks
+            skip = 0
+
+        return out
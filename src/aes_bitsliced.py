@@ -0,0 +1,338 @@
+from struct import pack
+from aes128 import AES128, InvalidBlockLengthError
+
+
+class BitslicedAES128:
+    """AES128 over Python integers holding one bit of the state for a whole batch of blocks: slice j of byte b has
+    bit k set when bit j of byte b of block k is. SubBytes is the Boyar-Peralta circuit and every other step a
+    permutation or XOR of slices, so no memory access depends on the data or the key."""
+    """https://eprint.iacr.org/2011/332.pdf"""
+    shift = tuple(row + 4 * ((column + row) % 4) for column in range(4) for row in range(4))
+    inv_shift = tuple(row + 4 * ((column - row) % 4) for column in range(4) for row in range(4))
+
+    transpose_masks = ((7, 0x00AA00AA00AA00AA), (14, 0x0000CCCC0000CCCC), (28, 0x00000000F0F0F0F0))
+
+    batch_blocks = 1 << 16
+
+    def __init__(self, cipher: AES128):
+        self.cipher = cipher
+        keys = pack(f">{len(cipher.encryption_keys)}I", *cipher.encryption_keys)
+        self.round_keys = tuple(tuple(keys[r * 16 + i // 8] >> i % 8 & 1 for i in range(128))
+                                for r in range(cipher.nr + 1))
+
+    @classmethod
+    def transpose(cls, x: int, words: int) -> int:
+        """https://github.com/hcs0/Hackers-Delight/blob/master/transpose8.c.txt
+        Transposes the 8x8 bit matrix held in every little-endian 64-bit word of x, it is its own inverse."""
+        for distance, mask in cls.transpose_masks:
+            mask = int.from_bytes(mask.to_bytes(8, "little") * words, "little")
+            t = (x ^ (x >> distance)) & mask
+            x ^= t ^ (t << distance)
+
+        return x
+
+    def to_slices(self, view: memoryview, n: int) -> list[list[int]]:
+        """n blocks, a multiple of 8, of view to 16 bytes of 8 slices."""
+        state = []
+
+        for b in range(16):
+            column = self.transpose(int.from_bytes(view[b::16], "little"), n // 8).to_bytes(n, "little")
+            state.append([int.from_bytes(column[j::8], "little") for j in range(8)])
+
+        return state
+
+    def from_slices(self, state: list[list[int]], out, n: int):
+        column = bytearray(n)
+
+        for b in range(16):
+            for j in range(8):
+                column[j::8] = state[b][j].to_bytes(n // 8, "little")
+
+            out[b::16] = self.transpose(int.from_bytes(column, "little"), n // 8).to_bytes(n, "little")
+
+    @staticmethod
+    def sub_byte(s: list[int], ones: int) -> list[int]:
+        """https://eprint.iacr.org/2011/332.pdf section 4, s least significant bit first."""
+        x0, x1, x2, x3, x4, x5, x6, x7 = s[7], s[6], s[5], s[4], s[3], s[2], s[1], s[0]
+
+        y14 = x3 ^ x5
+        y13 = x0 ^ x6
+        y9 = x0 ^ x3
+        y8 = x0 ^ x5
+        t0 = x1 ^ x2
+        y1 = t0 ^ x7
+        y4 = y1 ^ x3
+        y12 = y13 ^ y14
+        y2 = y1 ^ x0
+        y5 = y1 ^ x6
+        y3 = y5 ^ y8
+        t1 = x4 ^ y12
+        y15 = t1 ^ x5
+        y20 = t1 ^ x1
+        y6 = y15 ^ x7
+        y10 = y15 ^ t0
+        y11 = y20 ^ y9
+        y7 = x7 ^ y11
+        y17 = y10 ^ y11
+        y19 = y10 ^ y8
+        y16 = t0 ^ y11
+        y21 = y13 ^ y16
+        y18 = x0 ^ y16
+
+        t2 = y12 & y15
+        t3 = y3 & y6
+        t4 = t3 ^ t2
+        t5 = y4 & x7
+        t6 = t5 ^ t2
+        t7 = y13 & y16
+        t8 = y5 & y1
+        t9 = t8 ^ t7
+        t10 = y2 & y7
+        t11 = t10 ^ t7
+        t12 = y9 & y11
+        t13 = y14 & y17
+        t14 = t13 ^ t12
+        t15 = y8 & y10
+        t16 = t15 ^ t12
+        t17 = t4 ^ t14
+        t18 = t6 ^ t16
+        t19 = t9 ^ t14
+        t20 = t11 ^ t16
+        t21 = t17 ^ y20
+        t22 = t18 ^ y19
+        t23 = t19 ^ y21
+        t24 = t20 ^ y18
+
+        t25 = t21 ^ t22
+        t26 = t21 & t23
+        t27 = t24 ^ t26
+        t28 = t25 & t27
+        t29 = t28 ^ t22
+        t30 = t23 ^ t24
+        t31 = t22 ^ t26
+        t32 = t31 & t30
+        t33 = t32 ^ t24
+        t34 = t23 ^ t33
+        t35 = t27 ^ t33
+        t36 = t24 & t35
+        t37 = t36 ^ t34
+        t38 = t27 ^ t36
+        t39 = t29 & t38
+        t40 = t25 ^ t39
+
+        t41 = t40 ^ t37
+        t42 = t29 ^ t33
+        t43 = t29 ^ t40
+        t44 = t33 ^ t37
+        t45 = t42 ^ t41
+        z0 = t44 & y15
+        z1 = t37 & y6
+        z2 = t33 & x7
+        z3 = t43 & y16
+        z4 = t40 & y1
+        z5 = t29 & y7
+        z6 = t42 & y11
+        z7 = t45 & y17
+        z8 = t41 & y10
+        z9 = t44 & y12
+        z10 = t37 & y3
+        z11 = t33 & y4
+        z12 = t43 & y13
+        z13 = t40 & y5
+        z14 = t29 & y2
+        z15 = t42 & y9
+        z16 = t45 & y14
+        z17 = t41 & y8
+
+        t46 = z15 ^ z16
+        t47 = z10 ^ z11
+        t48 = z5 ^ z13
+        t49 = z9 ^ z10
+        t50 = z2 ^ z12
+        t51 = z2 ^ z5
+        t52 = z7 ^ z8
+        t53 = z0 ^ z3
+        t54 = z6 ^ z7
+        t55 = z16 ^ z17
+        t56 = z12 ^ t48
+        t57 = t50 ^ t53
+        t58 = z4 ^ t46
+        t59 = z3 ^ t54
+        t60 = t46 ^ t57
+        t61 = z14 ^ t57
+        t62 = t52 ^ t58
+        t63 = t49 ^ t58
+        t64 = z4 ^ t59
+        t65 = t61 ^ t62
+        t66 = z1 ^ t63
+        t67 = t64 ^ t65
+
+        s0 = t59 ^ t63
+        s6 = t56 ^ t62 ^ ones
+        s7 = t48 ^ t60 ^ ones
+        s3 = t53 ^ t66
+        s4 = t51 ^ t66
+        s5 = t47 ^ t65
+        s1 = t64 ^ s3 ^ ones
+        s2 = t55 ^ t67 ^ ones
+
+        return [s7, s6, s5, s4, s3, s2, s1, s0]
+
+    @classmethod
+    def inv_sub_byte(cls, s: list[int], ones: int) -> list[int]:
+        """The inverse S-box is the forward one between two inverse affine transforms."""
+        return cls.inv_affine(cls.sub_byte(cls.inv_affine(s, ones), ones), ones)
+
+    @staticmethod
+    def inv_affine(s: list[int], ones: int) -> list[int]:
+        """b <<< 1 ^ b <<< 3 ^ b <<< 6 ^ 0x05"""
+        return [s[(i - 1) % 8] ^ s[(i - 3) % 8] ^ s[(i - 6) % 8] ^ (ones if i in (0, 2) else 0) for i in range(8)]
+
+    @staticmethod
+    def xtime(a: list[int]) -> list[int]:
+        return [a[7], a[0] ^ a[7], a[1], a[2] ^ a[7], a[3] ^ a[7], a[4], a[5], a[6]]
+
+    @classmethod
+    def mix_columns(cls, state: list[list[int]]) -> list[list[int]]:
+        """https://en.wikipedia.org/wiki/Rijndael_MixColumns#Implementation_example"""
+        xtime, mixed = cls.xtime, []
+
+        for c in range(0, 16, 4):
+            a0, a1, a2, a3 = state[c:c + 4]
+            t = [a0[j] ^ a1[j] ^ a2[j] ^ a3[j] for j in range(8)]
+
+            for a, b in ((a0, a1), (a1, a2), (a2, a3), (a3, a0)):
+                x = xtime([a[j] ^ b[j] for j in range(8)])
+                mixed.append([a[j] ^ t[j] ^ x[j] for j in range(8)])
+
+        return mixed
+
+    @classmethod
+    def inv_mix_columns(cls, state: list[list[int]]) -> list[list[int]]:
+        xtime, state = cls.xtime, [list(a) for a in state]
+
+        for c in range(0, 16, 4):
+            a0, a1, a2, a3 = state[c:c + 4]
+            u = xtime(xtime([a0[j] ^ a2[j] for j in range(8)]))
+            v = xtime(xtime([a1[j] ^ a3[j] for j in range(8)]))
+
+            for j in range(8):
+                a0[j] ^= u[j]
+                a1[j] ^= v[j]
+                a2[j] ^= u[j]
+                a3[j] ^= v[j]
+
+        return cls.mix_columns(state)
+
+    def key_masks(self, ones: int) -> list[list[int]]:
+        """Every round key bit as a whole slice, ones or 0, so adding a round key touches all 128 slices whatever the
+        key is."""
+        return [[-bit & ones for bit in key] for key in self.round_keys]
+
+    @staticmethod
+    def add_round_key(state: list[list[int]], key: list[int]):
+        for i in range(128):
+            state[i >> 3][i & 7] ^= key[i]
+
+    def encrypt_slices(self, state: list[list[int]], ones: int) -> list[list[int]]:
+        keys, nr, sub_byte, shift = self.key_masks(ones), self.cipher.nr, self.sub_byte, self.shift
+        self.add_round_key(state, keys[0])
+
+        for r in range(1, nr + 1):
+            state = [sub_byte(state[shift[b]], ones) for b in range(16)]
+
+            if r != nr:
+                state = self.mix_columns(state)
+
+            self.add_round_key(state, keys[r])
+
+        return state
+
+    def decrypt_slices(self, state: list[list[int]], ones: int) -> list[list[int]]:
+        keys, nr, inv_sub_byte, inv_shift = self.key_masks(ones), self.cipher.nr, self.inv_sub_byte, self.inv_shift
+        self.add_round_key(state, keys[nr])
+
+        for r in range(nr - 1, -1, -1):
+            state = [inv_sub_byte(state[inv_shift[b]], ones) for b in range(16)]
+            self.add_round_key(state, keys[r])
+
+            if r:
+                state = self.inv_mix_columns(state)
+
+        return state
+
+    def apply(self, engine, data) -> bytearray:
+        view = memoryview(data).cast("B")
+        size = self.cipher.block_size
+
+        if len(view) % size:
+            raise InvalidBlockLengthError
+
+        out = bytearray(len(view))
+
+        for start in range(0, len(view), self.batch_blocks * size):
+            chunk = view[start:start + self.batch_blocks * size]
+            out[start:start + len(chunk)] = self.run(engine, chunk)
+
+        return out
+
+    def run(self, engine, chunk) -> bytearray:
+        """One batch of whole blocks, padded to a multiple of 8 blocks for the transposition."""
+        size = self.cipher.block_size
+        n = -(-len(chunk) // (8 * size)) * 8
+        padded = bytearray(chunk) + bytes(n * size - len(chunk))
+        result = bytearray(n * size)
+        self.from_slices(engine(self.to_slices(memoryview(padded), n), (1 << n) - 1), result, n)
+        del result[len(chunk):]
+
+        return result
+
+    def ecb_encrypt(self, clear_data) -> bytearray:
+        return self.apply(self.encrypt_slices, clear_data)
+
+    def ecb_decrypt(self, cipher_data) -> bytearray:
+        return self.apply(self.decrypt_slices, cipher_data)
+
+    def cbc_decrypt(self, cipher_data, iv: bytes = AES128.zero_iv) -> bytearray:
+        view = memoryview(cipher_data).cast("B")
+        size = self.cipher.block_size
+
+        if len(view) % size:
+            raise InvalidBlockLengthError
+
+        clear_data = bytearray(len(view))
+        batch = self.batch_blocks * size
+
+        for start in range(0, len(view), batch):
+            chunk = view[start:start + batch]
+            previous = iv if start == 0 else view[start - size:start]
+            chain = int.from_bytes(previous, "big") << 8 * (len(chunk) - size) | \
+                int.from_bytes(view[start:start + len(chunk) - size], "big")
+            decrypted = int.from_bytes(self.run(self.decrypt_slices, chunk), "big")
+            clear_data[start:start + len(chunk)] = (decrypted ^ chain).to_bytes(len(chunk), "big")
+
+        del clear_data[len(clear_data) - self.cipher.unpad_length(clear_data):]
+
+        return clear_data
+
+    def ctr_crypt(self, data, nonce: bytes, offset: int = 0) -> bytearray:
+        view = memoryview(data).cast("B")
+        out = bytearray(len(view))
+        size = self.cipher.block_size
+        counter = self.cipher.initial_counter(nonce) + offset // size
+        skip = offset % size
+        position = 0
+
+        while position < len(view):
+            n = min(self.batch_blocks * size - skip, len(view) - position)
+            blocks = -(-(skip + n) // size)
+            counters = b"".join(((counter + i) & 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF).to_bytes(size, "big")
+                                for i in range(blocks))
+            keystream = self.run(self.encrypt_slices, counters)
+            out[position:position + n] = (int.from_bytes(view[position:position + n], "big") ^
+                                          int.from_bytes(keystream[skip:skip + n], "big")).to_bytes(n, "big")
+            position += n
+            counter += blocks
+            skip = 0
+
+        return out
@@ -0,0 +1,214 @@
+import argparse
+import json
+import platform
+import sys
+from os import urandom
+from time import perf_counter, time
+from aes128 import AES128, InvalidTagError
+from aes_bitsliced import BitslicedAES128
+
+try:
+    from aes_batch import BatchAES128
+except ImportError:
+    BatchAES128 = None
+
+
+class KnownAnswerError(Exception):
+    pass
+
+
+SIZES = tuple(16 << 2 * i for i in range(12))
+
+KEY = "2b7e151628aed2a6abf7158809cf4f3c"
+SP800_38A_PLAIN = ("6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e51"
+                   "30c81c46a35ce411e5fbc1191a0a52eff69f2445df4f9b17ad2b417be66c3710")
+SP800_38A_IV = "000102030405060708090a0b0c0d0e0f"
+SP800_38A_COUNTER = "f0f1f2f3f4f5f6f7f8f9fafbfcfdfeff"
+
+FIPS_197 = (
+    ("000102030405060708090a0b0c0d0e0f", "00112233445566778899aabbccddeeff", "69c4e0d86a7b0430d8cdb78070b4c55a"),
+    (KEY, "3243f6a8885a308d313198a2e0370734", "3925841d02dc09fbdc118597196a0b32"),
+)
+
+SP800_38A = {
+    "ecb": ("3ad77bb40d7a3660a89ecaf32466ef97f5d3d58503b9699de785895a96fdbaaf"
+            "43b1cd7f598ece23881b00e3ed0306887b0c785e27e8ad3f8223207104725dd4"),
+    "cbc": ("7649abac8119b246cee98e9b12e9197d5086cb9b507219ee95db113a917678b2"
+            "73bed6b8e3c1743b7116e69e222295163ff1caa1681fac09120eca307586e1a7"),
+    "ctr": ("874d6191b620e3261bef6864990db6ce9806f66b7970fdff8617187bb9fffdff"
+            "5ae4df3edbd5d35e5b4f09020db03eab1e031dda2fbe03d1792170a0f3009cee"),
+}
+
+GCM = (
+    ("00000000000000000000000000000000", "000000000000000000000000", "00000000000000000000000000000000", "",
+     "0388dace60b6a392f328c2b971b2fe78", "ab6e47d42cec13bdf53a67b21257bddf"),
+    ("feffe9928665731c6d6a8f9467308308", "cafebabefacedbaddecaf888",
+     "d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72"
+     "1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39", "feedfacedeadbeeffeedfacedeadbeefabaddad2",
+     "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+     "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091", "5bc94fbc3221a5db94fae95ae7121a47"),
+)
+
+
+def check(name: str, result, expected: str):
+    if bytes(result).hex() != expected:
+        raise KnownAnswerError(name)
+
+
+def known_answers():
+    """FIPS-197 appendices B and C.1, SP 800-38A F.1.1, F.2.1, F.2.2 and F.5.1, GCM test cases 2 and 4."""
+    for key, clear, cipher in FIPS_197:
+        aes = AES128(key)
+        check("FIPS-197 encrypt", bytes.fromhex(aes.encrypt_block(clear)), cipher)
+        check("FIPS-197 decrypt", aes.ecb_decrypt(bytes.fromhex(cipher)), clear)
+
+    aes = AES128(KEY)
+    clear, iv = bytes.fromhex(SP800_38A_PLAIN), bytes.fromhex(SP800_38A_IV)
+    out = bytearray(len(clear))
+
+    check("SP 800-38A ECB encrypt", aes.ecb_encrypt(clear), SP800_38A["ecb"])
+    aes.encrypt_into(clear, out, iv)
+    check("SP 800-38A CBC encrypt", out, SP800_38A["cbc"])
+    aes.decrypt_into(bytes.fromhex(SP800_38A["cbc"]), out, iv)
+    check("SP 800-38A CBC decrypt", out, SP800_38A_PLAIN)
+    check("SP 800-38A CTR", aes.ctr_crypt(clear, bytes.fromhex(SP800_38A_COUNTER)), SP800_38A["ctr"])
+
+    bitsliced = BitslicedAES128(aes)
+    check("SP 800-38A ECB bitsliced", bitsliced.ecb_encrypt(clear), SP800_38A["ecb"])
+    check("SP 800-38A CBC decrypt bitsliced", bitsliced.cbc_decrypt(aes.encrypt_bytes(clear, iv), iv),
+          SP800_38A_PLAIN)
+    check("SP 800-38A CTR bitsliced", bitsliced.ctr_crypt(clear, bytes.fromhex(SP800_38A_COUNTER)), SP800_38A["ctr"])
+
+    if BatchAES128 is not None:
+        batch = BatchAES128(aes)
+        check("SP 800-38A ECB batch", batch.ecb_encrypt(clear), SP800_38A["ecb"])
+        check("SP 800-38A CTR batch", batch.ctr_crypt(clear, bytes.fromhex(SP800_38A_COUNTER)), SP800_38A["ctr"])
+
+    for key, iv, clear, data, cipher, tag in GCM:
+        cipher_data, tag_data = AES128(key).gcm_encrypt(bytes.fromhex(clear), bytes.fromhex(iv), bytes.fromhex(data))
+        check("GCM cipher", cipher_data, cipher)
+        check("GCM tag", tag_data, tag)
+        check("GCM decrypt", AES128(key).gcm_decrypt(bytes.fromhex(cipher), bytes.fromhex(iv), bytes.fromhex(tag),
+                                                     bytes.fromhex(data)), clear)
+
+        forged = bytearray(bytes.fromhex(tag))
+        forged[-1] ^= 1
+
+        for bad_tag in (bytes(forged), b"", bytes.fromhex(tag)[:1], bytes.fromhex(tag)[:11]):
+            try:
+                AES128(key).gcm_decrypt(bytes.fromhex(cipher), bytes.fromhex(iv), bad_tag, bytes.fromhex(data))
+            except InvalidTagError:
+                continue
+
+            raise KnownAnswerError("GCM forged tag accepted")
+
+
+def modes(aes: AES128) -> dict:
+    iv, nonce = urandom(16), urandom(12)
+    table = {
+        "ecb_encrypt": aes.ecb_encrypt,
+        "ecb_decrypt": aes.ecb_decrypt,
+        "cbc_encrypt": lambda data: aes.encrypt_bytes(data, iv),
+        "cbc_decrypt": lambda data: aes.decrypt_into(data, bytearray(len(data)), iv),
+        "ctr": lambda data: aes.ctr_crypt(data, nonce),
+        "gcm_encrypt": lambda data: aes.gcm_encrypt(data, nonce),
+    }
+
+    bitsliced = BitslicedAES128(aes)
+    table["bitsliced_ecb_encrypt"] = bitsliced.ecb_encrypt
+    table["bitsliced_ctr"] = lambda data: bitsliced.ctr_crypt(data, nonce)
+
+    if BatchAES128 is not None:
+        batch = BatchAES128(aes)
+        table["numpy_ecb_encrypt"] = batch.ecb_encrypt
+        table["numpy_ctr"] = lambda data: batch.ctr_crypt(data, nonce)
+
+    return table
+
+
+def measure(function, argument, min_time: float) -> tuple[float, int]:
+    repeat = 0
+    start = perf_counter()
+
+    while True:
+        function(argument)
+        repeat += 1
+        elapsed = perf_counter() - start
+
+        if elapsed >= min_time:
+            return elapsed / repeat, repeat
+
+
+def run(sizes, selected, min_time: float) -> dict:
+    aes = AES128(KEY)
+    results = []
+
+    seconds, repeat = measure(lambda key: AES128.key_schedules.__wrapped__(AES128, key), aes.key, min_time)
+    results.append({"mode": "key_setup", "size": 16, "seconds": seconds, "repeat": repeat,
+                    "us_per_block": seconds * 1e6, "mb_per_s": 16 / seconds / 1e6})
+
+    block = bytes(16).hex()
+    seconds, repeat = measure(aes.encrypt_block, block, min_time)
+    results.append({"mode": "encrypt_block", "size": 16, "seconds": seconds, "repeat": repeat,
+                    "us_per_block": seconds * 1e6, "mb_per_s": 16 / seconds / 1e6})
+
+    for mode, function in modes(aes).items():
+        if selected and mode not in selected:
+            continue
+
+        for size in sizes:
+            seconds, repeat = measure(function, urandom(size), min_time)
+            results.append({"mode": mode, "size": size, "seconds": seconds, "repeat": repeat,
+                            "us_per_block": seconds * 1e6 / (size // 16), "mb_per_s": size / seconds / 1e6})
+            print(f"{mode:>20} {size:>10} B {results[-1]['mb_per_s']:10.3f} MB/s", file=sys.stderr)
+
+    return {"timestamp": time(), "python": platform.python_version(), "machine": platform.machine(),
+            "results": results}
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    previous = {(r["mode"], r["size"]): r["mb_per_s"] for r in baseline["results"]}
+    slower = []
+
+    for r in report["results"]:
+        before = previous.get((r["mode"], r["size"]))
+
+        if before and r["mb_per_s"] < before * (1 - tolerance):
+            slower.append(f"{r['mode']} {r['size']} B: {before:.3f} -> {r['mb_per_s']:.3f} MB/s")
+
+    return slower
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="AES128 throughput, after the known-answer tests pass.")
+    parser.add_argument("--max-size", type=int, default=SIZES[-1], help="largest message size in bytes")
+    parser.add_argument("--mode", action="append", help="only run these modes, repeatable")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent on every measurement")
+    parser.add_argument("--output", help="write the JSON report there instead of stdout")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="accepted slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    known_answers()
+    report = run([size for size in SIZES if size <= args.max_size], args.mode, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            slower = regressions(report, json.load(file), args.tolerance)
+
+        for line in slower:
+            print(f"slower: {line}", file=sys.stderr)
+
+        return 1 if slower else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,19 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from os import cpu_count
+from threading import Lock
+
+
 class AuthorityCertificate:
+    cache_size = 1024
+    parallel_threshold = 256
+
+    _verified = OrderedDict()
+    _lock = Lock()
+    hits = 0
+    misses = 0
+
     def __init__(self, string: str):
         self.public_key = self.public_key_from_str(string)
 
@@ -7,13 +22,75 @@ class AuthorityCertificate:
 
     @staticmethod
     def public_key_from_str(string: str):
-        return {"e": int(string[5:9]), "n": int(string[16:])}
+        e, n = AuthorityCertificate.parse_public_key(string)
+
+        return {"e": e, "n": n}
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse_public_key(string: str) -> tuple[int, int]:
+        return int(string[5:9]), int(string[16:])
 
     def decrypt_certificate(self, certificate: tuple[int]) -> str:
+        return self.verify_many((certificate,))[0]
+
+    def verify_many(self, certificates, workers: int | None = None, executor: Executor | None = None) -> list[str]:
+        """Decrypts each distinct certificate once, through an LRU shared by every authority and keyed by the
+        certificate and the authority key. Batches of more than parallel_threshold misses go to a process pool."""
+        e, n = self.public_key["e"], self.public_key["n"]
+        keys = [(tuple(certificate), e, n) for certificate in certificates]
+        verified, results, missing = self._verified, {}, []
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in verified:
+                    verified.move_to_end(key)
+                    results[key] = verified[key]
+                    AuthorityCertificate.hits += 1
+                else:
+                    missing.append(key)
+                    AuthorityCertificate.misses += 1
+
+        workers = workers or cpu_count() or 1
+
+        if executor is None and (len(missing) <= self.parallel_threshold or workers == 1):
+            decrypted = [self.decrypt_blocks(*key) for key in missing]
+        else:
+            pool = executor or ProcessPoolExecutor(workers)
+
+            try:
+                decrypted = list(pool.map(self.decrypt_blocks, *zip(*missing),
+                                          chunksize=max(len(missing) // (workers * 4), 1)))
+            finally:
+                if executor is None:
+                    pool.shutdown()
+
+        with self._lock:
+            for key, public_key in zip(missing, decrypted):
+                results[key] = verified[key] = public_key
+
+                while len(verified) > self.cache_size:
+                    verified.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+    @classmethod
+    def cache_info(cls) -> dict:
+        with cls._lock:
+            return {"hits": cls.hits, "misses": cls.misses, "size": len(cls._verified), "max_size": cls.cache_size}
+
+    @classmethod
+    def cache_clear(cls):
+        with cls._lock:
+            cls._verified.clear()
+            cls.hits = cls.misses = 0
+
+    @staticmethod
+    def decrypt_blocks(certificate: tuple[int], e: int, n: int) -> str:
         blocks = []
 
         for block in certificate:
-            tmp = pow(block, self.public_key["e"], self.public_key["n"])
+            tmp = pow(block, e, n)
             letter_1 = tmp // 256
             letter_2 = letter_1 % 256
             letter_3 = tmp % 256
@@ -27,9 +104,4 @@ class AuthorityCertificate:
             blocks.append(letter_2)
             blocks.append(letter_3)
 
-        public_key = ""
-
-        for b in blocks:
-            public_key += chr(b)
-
-        return public_key
+        return "".join(map(chr, blocks))
@@ -1,4 +1,11 @@
-from utils import inverse_mod
+import json
+import random
+from collections import OrderedDict
+from math import isqrt
+from threading import Lock
+from weakref import WeakValueDictionary
+from utils import batch_inverse_mod, inverse_mod, prime_factors
+import metrics
 
 
 class NotOnTheSameCurveError(Exception):
@@ -13,14 +20,165 @@ class DoesntBelongToCurveError(Exception):
     pass
 
 
+class CardinalNotFoundError(Exception):
+    pass
+
+
+class NoDiscreteLogError(Exception):
+    pass
+
+
+class MismatchedTermsError(Exception):
+    pass
+
+
+INFINITY = (1, 1, 0)
+
+FIXED_BASE_CACHE_SIZE = 16
+FIXED_BASE_CACHE_POINTS = 1 << 16
+
+CARDINAL_SWEEP_LIMIT = 1 << 16
+CARDINAL_ATTEMPTS = 64
+
+BSGS_TABLE_LIMIT = 1 << 20
+RHO_THRESHOLD = 1 << 32
+
+_fixed_base_tables = OrderedDict()
+_fixed_base_lock = Lock()
+
+
+def _jacobian_double(point: tuple[int, int, int], a: int, p: int) -> tuple[int, int, int]:
+    """https://hyperelliptic.org/EFD/g1p/auto-shortw-jacobian.html#doubling-dbl-1998-cmo-2"""
+    if metrics.enabled:
+        metrics.count("elliptical.double")
+
+    x, y, z = point
+
+    if not y or not z:
+        return INFINITY
+
+    yy = y * y % p
+    s = 4 * x * yy % p
+    zz = z * z % p
+    m = (3 * x * x + a * zz * zz) % p
+    x3 = (m * m - 2 * s) % p
+
+    return x3, (m * (s - x3) - 8 * yy * yy) % p, 2 * y * z % p
+
+
+def _jacobian_add(first: tuple[int, int, int], second: tuple[int, int, int], a: int, p: int) -> tuple[int, int, int]:
+    """https://hyperelliptic.org/EFD/g1p/auto-shortw-jacobian.html#addition-add-1998-cmo-2
+    An affine second point (z = 1) saves four multiplications."""
+    if metrics.enabled:
+        metrics.count("elliptical.add")
+
+    x1, y1, z1 = first
+    x2, y2, z2 = second
+
+    if not z1:
+        return second
+    if not z2:
+        return first
+
+    z1z1 = z1 * z1 % p
+    u2 = x2 * z1z1 % p
+    s2 = y2 * z1 * z1z1 % p
+
+    if z2 == 1:
+        u1, s1 = x1, y1
+    else:
+        z2z2 = z2 * z2 % p
+        u1 = x1 * z2z2 % p
+        s1 = y1 * z2 * z2z2 % p
+
+    if u1 == u2:
+        return _jacobian_double(first, a, p) if s1 == s2 else INFINITY
+
+    h = u2 - u1
+    r = s2 - s1
+    hh = h * h % p
+    hhh = h * hh % p
+    v = u1 * hh % p
+    x3 = (r * r - hhh - 2 * v) % p
+
+    return x3, (r * (v - x3) - s1 * hhh) % p, (z1 * h if z2 == 1 else z1 * z2 * h) % p
+
+
+def _wnaf(scalar: int, width: int) -> list[int]:
+    """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#w-ary_non-adjacent_form_(wNAF)_method
+    Least significant digit first, every non-zero digit is odd and below 2^(width - 1) in absolute value."""
+    digits = []
+    modulus = 1 << width
+
+    while scalar:
+        if scalar & 1:
+            digit = scalar & (modulus - 1)
+
+            if digit >= modulus >> 1:
+                digit -= modulus
+
+            scalar -= digit
+        else:
+            digit = 0
+
+        digits.append(digit)
+        scalar >>= 1
+
+    return digits
+
+
+def _wnaf_width(bits: int) -> int:
+    """Trades the 2^(width - 2) precomputed points against one addition every width + 1 bits."""
+    return min(range(2, 9), key=lambda width: (1 << (width - 2)) + bits / (width + 1))
+
+
+def _odd_multiples(base: tuple[int, int, int], width: int, a: int, p: int) -> list[tuple[int, int, int]]:
+    """base, 3 * base, ..., (2^(width - 1) - 1) * base, the table wNAF digits index with digit >> 1."""
+    double = _jacobian_double(base, a, p)
+    odd_multiples = [base]
+
+    for _ in range((1 << (width - 2)) - 1):
+        odd_multiples.append(_jacobian_add(odd_multiples[-1], double, a, p))
+
+    return odd_multiples
+
+
 class EllipticalCurve:
-    def __init__(self, a: int, b: int, p: int):
-        self.a = a
-        self.b = b
-        self.p = p
+    """Interned: building a curve with the parameters of a live one returns that same object, so checking that two
+    points share a curve is an identity test."""
+    __slots__ = ("a", "b", "p", "_cardinal", "_sqrt_parameters", "__weakref__")
+
+    _interned = WeakValueDictionary()
+
+    def __new__(cls, a: int, b: int, p: int):
+        curve = cls._interned.get((a, b, p))
+
+        if curve is None:
+            curve = super().__new__(cls)
+            object.__setattr__(curve, "a", a)
+            object.__setattr__(curve, "b", b)
+            object.__setattr__(curve, "p", p)
+            object.__setattr__(curve, "_cardinal", None)
+            object.__setattr__(curve, "_sqrt_parameters", None)
+            cls._interned[(a, b, p)] = curve
+
+        return curve
+
+    def __setattr__(self, name, value):
+        """Only the memoized private attributes can change."""
+        if not name.startswith("_"):
+            raise AttributeError(f"{type(self).__name__} is immutable")
+
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        return EllipticalCurve, (self.a, self.b, self.p)
 
     def __eq__(self, other):
-        return self.a == other.a and self.b == other.b and self.p == other.p
+        return self is other or (self.a == other.a and self.b == other.b and self.p == other.p)
+
+    def __hash__(self):
+        return hash((self.a, self.b, self.p))
 
     def __repr__(self):
         return f"y\N{SUPERSCRIPT TWO} = x\N{SUPERSCRIPT THREE} + {self.a}x + {self.b} mod {self.p}"
@@ -29,21 +187,150 @@ class EllipticalCurve:
         return (pow(x, 3) + (self.a * x) + self.b) % self.p
 
     def x_solutions(self, x: int) -> bool | int:
-        return self.modular_sqrt(self.value_at_x(x), self.p)
+        return self.sqrt(self.value_at_x(x))
+
+    def sqrt(self, a: int) -> int:
+        """modular_sqrt with everything that only depends on p computed once per curve: a single exponentiation
+        when p = 3 mod 4 or p = 5 mod 8 (Atkin), Tonelli-Shanks with a cached non-residue otherwise. 0 when there is
+        none."""
+        if metrics.enabled:
+            metrics.count("elliptical.sqrt")
+
+        p = self.p
+        a %= p
+
+        if not a or p == 2:
+            return self.modular_sqrt(a, p)
+
+        if self._sqrt_parameters is None:
+            self._sqrt_parameters = self.sqrt_parameters()
+
+        kind, exponent, s, e, g = self._sqrt_parameters
+
+        if kind == 3:
+            root = pow(a, exponent, p)
+        elif kind == 5:
+            v = pow(2 * a, exponent, p)
+            i = 2 * a * v * v % p
+            root = a * v * (i - 1) % p
+        else:
+            if pow(a, (p - 1) // 2, p) != 1:
+                return 0
+
+            root, b, r = pow(a, (s + 1) // 2, p), pow(a, s, p), e
+
+            while b != 1:
+                t, m = b, 0
+
+                while t != 1:
+                    t = t * t % p
+                    m += 1
+
+                gs = pow(g, 1 << (r - m - 1), p)
+                g, r = gs * gs % p, m
+                root, b = root * gs % p, b * g % p
+
+        return root if root * root % p == a else 0
+
+    def sqrt_parameters(self) -> tuple[int, int, int, int, int]:
+        """https://en.wikipedia.org/wiki/Tonelli%E2%80%93Shanks_algorithm"""
+        p = self.p
+
+        if p % 4 == 3:
+            return 3, (p + 1) // 4, 0, 0, 0
+        if p % 8 == 5:
+            return 5, (p - 5) // 8, 0, 0, 0
+
+        s, e = p - 1, 0
+
+        while s % 2 == 0:
+            s //= 2
+            e += 1
+
+        n = 2
+
+        while pow(n, (p - 1) // 2, p) != p - 1:
+            n += 1
+
+        return 1, 0, s, e, pow(n, s, p)
 
     def cardinal(self) -> int:
-        """https://en.wikipedia.org/wiki/Counting_points_on_elliptic_curves#Naive_approach"""
-        result = 2
+        """Memoized, exact sweep for small p and Mestre's baby-step giant-step above CARDINAL_SWEEP_LIMIT."""
+        if self._cardinal is None:
+            if self.p <= CARDINAL_SWEEP_LIMIT:
+                self._cardinal = self.count_points_by_sweep()
+            else:
+                self._cardinal = self.count_points_by_bsgs()
+
+        return self._cardinal
 
-        for x in range(self.p):
-            if self.x_solutions(x):
-                result += 2
+    def count_points_by_sweep(self) -> int:
+        """https://en.wikipedia.org/wiki/Counting_points_on_elliptic_curves#Naive_approach
+        Quadratic residues are marked once in a bitmap instead of running modular_sqrt for every x."""
+        p = self.p
+        squares = bytearray(p)
+
+        for y in range(1, p // 2 + 1):
+            squares[y * y % p] = 1
+
+        result = 1
+
+        for x in range(p):
+            value = self.value_at_x(x)
+            result += 2 * squares[value] if value else 1
 
         return result
 
+    def count_points_by_bsgs(self) -> int:
+        """https://en.wikipedia.org/wiki/Counting_points_on_elliptic_curves#Baby-step_giant-step
+        Keeps the orders in the Hasse interval that every random point of the curve, or of its quadratic twist whose
+        order is 2p + 2 - #E, is killed by, until a single one is left."""
+        p = self.p
+        low, high = max(p + 1 - 2 * isqrt(p) - 2, 1), p + 1 + 2 * isqrt(p) + 2
+        twist = self.twist()
+        candidates = None
+
+        for attempt in range(CARDINAL_ATTEMPTS):
+            if attempt % 2 == 0:
+                found = set(_multiples_in_interval(self.random_point(), low, high))
+            else:
+                found = {2 * p + 2 - n for n in _multiples_in_interval(twist.random_point(), 2 * p + 2 - high,
+                                                                       2 * p + 2 - low)}
+
+            candidates = found if candidates is None else candidates & found
+
+            if len(candidates) == 1:
+                return candidates.pop()
+
+        raise CardinalNotFoundError
+
+    def twist(self):
+        """https://en.wikipedia.org/wiki/Twists_of_elliptic_curves"""
+        d = 2
+
+        while self.sqrt(d) or d % self.p == 0:
+            d += 1
+
+        return EllipticalCurve(self.a * d * d % self.p, self.b * d * d * d % self.p, self.p)
+
+    def random_point(self):
+        while True:
+            x = random.randrange(self.p)
+            value = self.value_at_x(x)
+
+            if not value:
+                return EllipticalPoint(x, 0, self)
+
+            y = self.sqrt(value)
+
+            if y:
+                return EllipticalPoint(x, y, self)
+
     @staticmethod
     def modular_sqrt(a: int, p: int) -> int:
         """https://gist.github.com/nakov/60d62bdf4067ea72b7832ce9f71ae079"""
+        if metrics.enabled:
+            metrics.count("elliptical.modular_sqrt")
 
         def legendre_symbol(a_bis: int, p_bis: int) -> int:
             ls = pow(a_bis, (p_bis - 1) // 2, p_bis)
@@ -92,23 +379,39 @@ class EllipticalCurve:
 
 
 class EllipticalPoint:
+    __slots__ = ("x", "y", "curve")
+
     def __init__(self, x: int | None, y: int | None, curve: EllipticalCurve):
-        self.x = x
-        self.y = y
-        self.curve = curve
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "curve", curve)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return EllipticalPoint, (self.x, self.y, self.curve)
 
     def __eq__(self, other):
         if not isinstance(other, EllipticalPoint):
-            raise NotAnEllipticalPointError
-        if not self.curve == other.curve:
-            raise NotOnTheSameCurveError
-        return self.x == other.x and self.y == other.y
+            return NotImplemented
+        return self.curve is other.curve and self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return hash((self.x, self.y, self.curve))
 
     def __add__(self, other):
         """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication"""
+        if not isinstance(other, EllipticalPoint):
+            raise NotAnEllipticalPointError
+        if self.curve is not other.curve:
+            raise NotOnTheSameCurveError
         if isinstance(other, PointAtInfinity):
             return self
 
+        if metrics.enabled:
+            metrics.count("elliptical.affine_add")
+
         if self == other:
             s = (3 * pow(self.x, 2) + self.curve.a) * inverse_mod(2 * self.y, self.curve.p)
         else:
@@ -124,18 +427,72 @@ class EllipticalPoint:
 
         return EllipticalPoint(x % self.curve.p, y % self.curve.p, self.curve)
 
+    @metrics.timed("elliptical.scalar_mul")
     def __mul__(self, scalar: int):
-        """https://onyb.gitbook.io/secp256k1-python/scalar-multiplication-in-python"""
-        tmp = self
-        result = PointAtInfinity(self.curve)
+        """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#w-ary_non-adjacent_form_(wNAF)_method
+        Runs in Jacobian coordinates, so the only field inversion is the final conversion back to affine."""
+        table = FixedBaseTable.lookup(self)
 
-        while scalar:
-            if scalar & 1:
-                result = result + tmp
-            tmp = tmp + tmp
-            scalar >>= 1
+        if table is not None and 0 <= scalar and scalar.bit_length() <= table.bits:
+            return table.multiply(scalar)
 
-        return result
+        a, p = self.curve.a, self.curve.p
+        width = _wnaf_width(scalar.bit_length())
+        odd_multiples = _odd_multiples(self.to_jacobian(), width, a, p)
+        result = INFINITY
+
+        for digit in reversed(_wnaf(scalar, width)):
+            result = _jacobian_double(result, a, p)
+
+            if digit > 0:
+                result = _jacobian_add(result, odd_multiples[digit >> 1], a, p)
+            elif digit < 0:
+                x, y, z = odd_multiples[-digit >> 1]
+                result = _jacobian_add(result, (x, p - y, z), a, p)
+
+        return self.from_jacobian(result, self.curve)
+
+    @metrics.timed("elliptical.ladder")
+    def ladder(self, scalar: int, order: int | None = None):
+        """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#Montgomery_ladder
+        For secret scalars: one addition and one doubling per bit whatever the scalar is. The scalar is given a fixed
+        top bit so the ladder starts from (P, 2P) instead of the point at infinity: scalar % n + n or + 2n with n
+        the point order (or the curve cardinal when cached), otherwise scalar + 2^bits with 2^bits * P taken off at
+        the end."""
+        if scalar < 0:
+            return (-self).ladder(-scalar, order)
+
+        a, p = self.curve.a, self.curve.p
+        order = order or self.curve._cardinal
+        correction = None
+
+        if order:
+            bits = order.bit_length()
+            k = scalar % order + order
+
+            if k.bit_length() <= bits:
+                k += order
+        else:
+            bits = max(p.bit_length() + 1, scalar.bit_length())
+            k = scalar | 1 << bits
+            correction = self.to_jacobian()
+
+            for _ in range(bits):
+                correction = _jacobian_double(correction, a, p)
+
+        base = self.to_jacobian()
+        r = [base, _jacobian_double(base, a, p)]
+
+        for i in reversed(range(bits)):
+            bit = k >> i & 1
+            r[1 - bit] = _jacobian_add(r[0], r[1], a, p)
+            r[bit] = _jacobian_double(r[bit], a, p)
+
+        if correction is not None:
+            x, y, z = correction
+            r[0] = _jacobian_add(r[0], (x, -y % p, z), a, p)
+
+        return self.from_jacobian(r[0], self.curve)
 
     def __rmul__(self, scalar: int):
         return self * scalar
@@ -143,6 +500,53 @@ class EllipticalPoint:
     def __repr__(self):
         return f"({self.x},{self.y})"
 
+    def precompute(self, window: int = 4):
+        """Opt-in table for a base point multiplied by many scalars, it holds (2^window - 1) points per window
+        bits."""
+        return FixedBaseTable(self, window).register()
+
+    def to_jacobian(self) -> tuple[int, int, int]:
+        return (self.x, self.y, 1) if self.x is not None else INFINITY
+
+    @staticmethod
+    def from_jacobian(point: tuple[int, int, int], curve: EllipticalCurve):
+        x, y, z = point
+
+        if not z:
+            return PointAtInfinity(curve)
+
+        z_inv = inverse_mod(z, curve.p)
+        zz_inv = z_inv * z_inv % curve.p
+
+        return EllipticalPoint(x * zz_inv % curve.p, y * zz_inv * z_inv % curve.p, curve)
+
+    def encode(self, compressed: bool = True) -> bytes:
+        """https://www.secg.org/sec1-v2.pdf#subsubsection.2.3.3"""
+        if self.x is None:
+            return b"\x00"
+
+        width = (self.curve.p.bit_length() + 7) // 8
+
+        if compressed:
+            return bytes((2 | self.y & 1,)) + self.x.to_bytes(width, "big")
+
+        return b"\x04" + self.x.to_bytes(width, "big") + self.y.to_bytes(width, "big")
+
+    @staticmethod
+    def decode(data, curve: EllipticalCurve):
+        """https://www.secg.org/sec1-v2.pdf#subsubsection.2.3.4"""
+        view = memoryview(data).cast("B")
+
+        if not len(view):
+            raise DoesntBelongToCurveError
+
+        point, end = _decode_point(view, 0, curve)
+
+        if end != len(view):
+            raise DoesntBelongToCurveError
+
+        return point
+
     @staticmethod
     def create_point_from_x(x: int, curve: EllipticalCurve):
         y = curve.x_solutions(x)
@@ -153,27 +557,588 @@ class EllipticalPoint:
             return EllipticalPoint(x, y, curve), EllipticalPoint(x, curve.p - y, curve)
 
     def find_n_in_np(self, np) -> int:
-        n = 1
+        """Smallest n >= 1 with (n * self).x == np.x, from the discrete log k of np: n is k or order - k."""
+        order = self.find_order()
 
-        while (n * self).x != np.x:
-            n += 1
+        if np.x is None:
+            return order
+
+        k = self.discrete_log(np, order)
 
-        return n
+        return min(k, order - k) or order
 
     def find_order(self) -> int:
-        order = 1
-        o = PointAtInfinity(self.curve)
+        """https://en.wikipedia.org/wiki/Pohlig%E2%80%93Hellman_algorithm
+        Starts from the curve order when cardinal() is known, otherwise from a multiple of the order found by
+        baby-step giant-step in the Hasse interval, then divides out every prime factor the point survives
+        without."""
+        if self.x is None:
+            return 1
+
+        if self.curve._cardinal is not None:
+            order = self.curve._cardinal
+        else:
+            p = self.curve.p
+            order = _multiples_in_interval(self, max(p + 1 - 2 * isqrt(p) - 2, 1), p + 1 + 2 * isqrt(p) + 2)[0]
 
-        while order * self != o:
-            order += 1
+        for q in set(prime_factors(order)):
+            while order % q == 0 and (self * (order // q)).x is None:
+                order //= q
 
         return order
 
+    def discrete_log(self, target, order: int | None = None) -> int:
+        """k with k * self = target, solved modulo each prime power of the order and recombined with the CRT, the
+        prime order sub-problems going to baby-step giant-step below RHO_THRESHOLD and to Pollard's rho above."""
+        order = order or self.find_order()
+
+        if (target * order).x is not None:
+            raise NoDiscreteLogError
+
+        residues, moduli = [], []
+        factors = prime_factors(order)
+
+        for q in set(factors):
+            e = factors.count(q)
+            generator = self * (order // q)
+            x = 0
+
+            for k in range(e):
+                h = (target + -(self * x)) * (order // q ** (k + 1))
+
+                if h.x is None:
+                    d = 0
+                elif q < RHO_THRESHOLD:
+                    d = _bsgs_log(generator, h, q)
+                else:
+                    d = _rho_log(generator, h, q)
+
+                if d is None:
+                    raise NoDiscreteLogError
+
+                x += d * q ** k
+
+            residues.append(x)
+            moduli.append(q ** e)
+
+        k = 0
+
+        for residue, modulus in zip(residues, moduli):
+            rest = order // modulus
+            k += residue * rest * pow(rest, -1, modulus)
+
+        k %= order
+
+        if (self * k).x != target.x or (self * k).y != target.y:
+            raise NoDiscreteLogError
+
+        return k
+
+    def __neg__(self):
+        if self.x is None:
+            return self
+
+        return EllipticalPoint(self.x, -self.y % self.curve.p, self.curve)
+
+
+def _decode_point(view: memoryview, offset: int, curve: EllipticalCurve) -> tuple[EllipticalPoint, int]:
+    """Decodes the point starting at offset and returns it with the offset of the next one."""
+    width = (curve.p.bit_length() + 7) // 8
+    prefix = view[offset]
+
+    if prefix == 0:
+        return PointAtInfinity(curve), offset + 1
+    if offset + 1 + (2 * width if prefix == 4 else width) > len(view):
+        raise DoesntBelongToCurveError
+
+    x = int.from_bytes(view[offset + 1:offset + 1 + width], "big")
+
+    if prefix == 4:
+        y = int.from_bytes(view[offset + 1 + width:offset + 1 + 2 * width], "big")
+
+        if x >= curve.p or y >= curve.p or y * y % curve.p != curve.value_at_x(x):
+            raise DoesntBelongToCurveError
+
+        return EllipticalPoint(x, y, curve), offset + 1 + 2 * width
+
+    if prefix not in (2, 3) or x >= curve.p:
+        raise DoesntBelongToCurveError
+
+    value = curve.value_at_x(x)
+    y = curve.sqrt(value)
+
+    if not y and (value or prefix & 1):
+        raise DoesntBelongToCurveError
+    if y & 1 != prefix & 1:
+        y = -y % curve.p
+
+    return EllipticalPoint(x, y, curve), offset + 1 + width
+
+
+def decode_points(buffer, curve: EllipticalCurve) -> list[EllipticalPoint]:
+    """Back to back SEC1 encodings, compressed or not, as received in bulk over the wire."""
+    view = memoryview(buffer).cast("B")
+    points = []
+    offset = 0
+
+    while offset < len(view):
+        point, offset = _decode_point(view, offset, curve)
+        points.append(point)
+
+    return points
+
+
+PIPPENGER_THRESHOLD = 96
+
+
+@metrics.timed("elliptical.multi_scalar_mul")
+def multi_scalar_mul(scalars: list[int], points: list[EllipticalPoint]) -> EllipticalPoint:
+    """sum(k * P) sharing one doubling chain between every term, Straus below PIPPENGER_THRESHOLD terms and Pippenger
+    from there on."""
+    if not points or len(scalars) != len(points):
+        raise MismatchedTermsError
+
+    curve = points[0].curve
+
+    for point in points:
+        if point.curve is not curve:
+            raise NotOnTheSameCurveError
+
+    jacobian_points = [point.to_jacobian() for point in points]
+
+    if len(points) < PIPPENGER_THRESHOLD:
+        result = _straus(scalars, jacobian_points, curve.a, curve.p)
+    else:
+        result = _pippenger(scalars, jacobian_points, curve.a, curve.p)
+
+    return EllipticalPoint.from_jacobian(result, curve)
+
+
+def _straus(scalars: list[int], points: list[tuple[int, int, int]], a: int, p: int) -> tuple[int, int, int]:
+    """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#Straus's_algorithm"""
+    width = _wnaf_width(max(scalars).bit_length())
+    tables = [_odd_multiples(point, width, a, p) for point in points]
+    digits = [_wnaf(scalar, width) for scalar in scalars]
+    result = INFINITY
+
+    for i in reversed(range(max(map(len, digits)))):
+        result = _jacobian_double(result, a, p)
+
+        for table, naf in zip(tables, digits):
+            digit = naf[i] if i < len(naf) else 0
+
+            if digit > 0:
+                result = _jacobian_add(result, table[digit >> 1], a, p)
+            elif digit < 0:
+                x, y, z = table[-digit >> 1]
+                result = _jacobian_add(result, (x, p - y, z), a, p)
+
+    return result
+
+
+def _pippenger(scalars: list[int], points: list[tuple[int, int, int]], a: int, p: int) -> tuple[int, int, int]:
+    """https://cr.yp.to/papers/pippenger-20240922.pdf, bucket method: every window adds each point once into the
+    bucket of its digit, then sums the buckets with running sums. Negative terms become -k * -P first."""
+    points = [(x, p - y, z) if scalar < 0 else (x, y, z) for scalar, (x, y, z) in zip(scalars, points)]
+    scalars = [abs(scalar) for scalar in scalars]
+    window = min(range(2, 17), key=lambda c: (len(points) + (2 << c)) / c)
+    mask = (1 << window) - 1
+    result = INFINITY
+
+    for shift in reversed(range(0, max(scalars).bit_length(), window)):
+        for _ in range(window):
+            result = _jacobian_double(result, a, p)
+
+        buckets = [INFINITY] * (mask + 1)
+
+        for scalar, point in zip(scalars, points):
+            digit = scalar >> shift & mask
+
+            if digit:
+                buckets[digit] = _jacobian_add(buckets[digit], point, a, p)
+
+        running = total = INFINITY
+
+        for bucket in reversed(buckets[1:]):
+            running = _jacobian_add(running, bucket, a, p)
+            total = _jacobian_add(total, running, a, p)
+
+        result = _jacobian_add(result, total, a, p)
+
+    return result
+
+
+def normalize_points(points: list[tuple[int, int, int]], curve: EllipticalCurve) -> list[EllipticalPoint]:
+    """Jacobian to affine for a whole list with a single shared inversion."""
+    p = curve.p
+    inverses = batch_inverse_mod([z for _, _, z in points], p)
+    result = []
+
+    for (x, y, z), z_inv in zip(points, inverses):
+        if not z:
+            result.append(PointAtInfinity(curve))
+        else:
+            zz_inv = z_inv * z_inv % p
+            result.append(EllipticalPoint(x * zz_inv % p, y * zz_inv * z_inv % p, curve))
+
+    return result
+
+
+def add_pairs(firsts: list[EllipticalPoint], seconds: list[EllipticalPoint]) -> list[EllipticalPoint]:
+    """Affine firsts[i] + seconds[i] for every i, the slopes of all pairs sharing one inversion."""
+    if not firsts:
+        return []
+
+    curve = firsts[0].curve
+    a, p = curve.a, curve.p
+    denominators = []
+
+    for first, second in zip(firsts, seconds):
+        if first.x is None or second.x is None:
+            denominators.append(0)
+        elif first.x == second.x:
+            denominators.append(2 * first.y if first.y == second.y else 0)
+        else:
+            denominators.append(second.x - first.x)
+
+    result = []
+
+    for first, second, inverse in zip(firsts, seconds, batch_inverse_mod(denominators, p)):
+        if first.x is None:
+            result.append(second)
+        elif second.x is None:
+            result.append(first)
+        elif not inverse:
+            result.append(PointAtInfinity(curve))
+        else:
+            if first.x == second.x:
+                s = (3 * first.x * first.x + a) * inverse % p
+            else:
+                s = (second.y - first.y) * inverse % p
+
+            x = (s * s - first.x - second.x) % p
+            result.append(EllipticalPoint(x, (s * (first.x - x) - first.y) % p, curve))
+
+    return result
+
+
+def _multiples_in_interval(point: EllipticalPoint, low: int, high: int) -> list[int]:
+    """https://en.wikipedia.org/wiki/Baby-step_giant-step
+    Every m in [low, high] with m * point = O. Baby steps j * point are kept in a dict, giant steps are
+    (low + i * step) * point and hit the table on -j * point, both normalized one step-sized batch at a time.
+    Like in _bsgs_log the table is capped at BSGS_TABLE_LIMIT baby steps and wider intervals take more giant
+    steps."""
+    curve = point.curve
+    a, p = curve.a, curve.p
+    step = min(isqrt(high - low) + 1, BSGS_TABLE_LIMIT)
+    base = point.to_jacobian()
+    babies = [base]
+
+    for _ in range(step - 2):
+        babies.append(_jacobian_add(babies[-1], base, a, p))
+
+    table = {}
+
+    for j, baby in enumerate(normalize_points(babies, curve), 1):
+        if baby.x is None:
+            return list(range(-(-low // j) * j, high + 1, j))
+
+        table[(baby.x, baby.y)] = j
+
+    jump = _jacobian_add(babies[-1], base, a, p)
+    giant = (point * low).to_jacobian()
+    multiples = []
+    i = 0
+
+    while low + i * step <= high:
+        giants = []
+
+        for _ in range(step):
+            giants.append(giant)
+            giant = _jacobian_add(giant, jump, a, p)
+
+        for g in normalize_points(giants, curve):
+            if g.x is None:
+                j = 0
+            else:
+                j = table.get((g.x, -g.y % p))
+
+            if j is not None and low + i * step + j <= high:
+                multiples.append(low + i * step + j)
+
+            i += 1
+
+    return multiples
+
+
+def _bsgs_log(generator: EllipticalPoint, target: EllipticalPoint, order: int) -> int | None:
+    """https://en.wikipedia.org/wiki/Baby-step_giant-step
+    The table holds at most BSGS_TABLE_LIMIT baby steps, past that the giant steps get more numerous instead."""
+    curve = generator.curve
+    a, p = curve.a, curve.p
+    step = min(isqrt(order) + 1, BSGS_TABLE_LIMIT)
+    base = generator.to_jacobian()
+    babies = [base]
+
+    for _ in range(step - 2):
+        babies.append(_jacobian_add(babies[-1], base, a, p))
+
+    table = {(baby.x, baby.y): j for j, baby in enumerate(normalize_points(babies, curve), 1)}
+    x, y, z = _jacobian_add(babies[-1], base, a, p)
+    jump = (x, -y % p, z)
+    giant = target.to_jacobian()
+    i = 0
+
+    while i * step < order:
+        giants = []
+
+        for _ in range(step):
+            giants.append(giant)
+            giant = _jacobian_add(giant, jump, a, p)
+
+        for g in normalize_points(giants, curve):
+            j = 0 if g.x is None else table.get((g.x, g.y))
+
+            if j is not None:
+                return (i * step + j) % order
+
+            i += 1
+
+    return None
+
+
+def _rho_log(generator: EllipticalPoint, target: EllipticalPoint, order: int, partitions: int = 16) -> int | None:
+    """https://en.wikipedia.org/wiki/Pollard%27s_rho_algorithm_for_logarithms
+    r-adding walks on a * generator + b * target, only the distinguished points (low x bits all zero) are stored, so
+    memory stays around sqrt(order) / 2^bits entries. order has to be prime."""
+    curve = generator.curve
+    p = curve.p
+    bits = max(order.bit_length() // 2 - 6, 0)
+    mask = (1 << bits) - 1
+    steps = []
+
+    for _ in range(partitions):
+        c, d = random.randrange(order), random.randrange(order)
+        point = multi_scalar_mul([c, d], [generator, target])
+        steps.append((c, d, point.x, point.y))
+
+    distinguished = {}
+
+    for _ in range(64 << bits):
+        a, b = random.randrange(order), random.randrange(order)
+        point = multi_scalar_mul([a, b], [generator, target])
+        x, y = point.x, point.y
+
+        for _ in range(32 << bits):
+            if x is None:
+                break
+
+            if not x & mask:
+                seen = distinguished.setdefault((x, y), (a, b))
+
+                if seen != (a, b) and (seen[1] - b) % order:
+                    return (a - seen[0]) * pow(seen[1] - b, -1, order) % order
+
+                break
+
+            c, d, x2, y2 = steps[x % partitions]
+            a, b = (a + c) % order, (b + d) % order
+
+            if x2 is None:
+                continue
+            if x == x2:
+                if y != y2 or not y:
+                    x = y = None
+                    continue
+                s = (3 * x * x + curve.a) * inverse_mod(2 * y, p) % p
+            else:
+                s = (y2 - y) * inverse_mod(x2 - x, p) % p
+
+            x3 = (s * s - x - x2) % p
+            x, y = x3, (s * (x - x3) - y) % p
+
+    return None
+
+
+def sum_points(points: list[EllipticalPoint], curve: EllipticalCurve) -> EllipticalPoint:
+    """Adds points in Jacobian coordinates with a single inversion at the end."""
+    result = INFINITY
+
+    for point in points:
+        result = _jacobian_add(result, point.to_jacobian(), curve.a, curve.p)
+
+    return EllipticalPoint.from_jacobian(result, curve)
+
+
+class FixedBaseTable:
+    """https://en.wikipedia.org/wiki/Elliptic_curve_point_multiplication#Fixed-window
+    Row i holds d * 2^(window * i) * point for every non-zero digit d, so k * point is one addition per window and no
+    doubling at all."""
+
+    def __init__(self, point: EllipticalPoint, window: int = 4, points=None):
+        self.point = point
+        self.window = window
+        self.bits = -(-(point.curve.p.bit_length() + 1) // window) * window
+        self.points = points if points is not None else self.build()
+
+    def __repr__(self):
+        return f"FixedBaseTable({self.point}, window={self.window}, points={len(self.points)})"
+
+    @staticmethod
+    def key(point: EllipticalPoint) -> tuple:
+        return point.curve, point.x, point.y
+
+    @classmethod
+    def lookup(cls, point: EllipticalPoint):
+        if not _fixed_base_tables:
+            return None
+
+        key = cls.key(point)
+
+        with _fixed_base_lock:
+            table = _fixed_base_tables.get(key)
+
+            if table is not None:
+                _fixed_base_tables.move_to_end(key)
+
+        return table
+
+    def register(self):
+        """Keeps at most FIXED_BASE_CACHE_SIZE tables and FIXED_BASE_CACHE_POINTS points, least recently used out
+        first. A table larger than the whole budget is still returned but not kept."""
+        if len(self.points) > FIXED_BASE_CACHE_POINTS:
+            return self
+
+        with _fixed_base_lock:
+            _fixed_base_tables[self.key(self.point)] = self
+            _fixed_base_tables.move_to_end(self.key(self.point))
+            total = sum(len(table.points) for table in _fixed_base_tables.values())
+
+            while len(_fixed_base_tables) > FIXED_BASE_CACHE_SIZE or total > FIXED_BASE_CACHE_POINTS:
+                _, table = _fixed_base_tables.popitem(last=False)
+                total -= len(table.points)
+
+        return self
+
+    def build(self):
+        curve = self.point.curve
+        base = self.point.to_jacobian()
+        multiples = []
+
+        for _ in range(self.bits // self.window):
+            multiple = base
+
+            for _ in range((1 << self.window) - 1):
+                multiples.append(multiple)
+                multiple = _jacobian_add(multiple, base, curve.a, curve.p)
+
+            base = multiple
+
+        return PointArray(curve, normalize_points(multiples, curve))
+
+    def multiply(self, scalar: int) -> EllipticalPoint:
+        a, p = self.point.curve.a, self.point.curve.p
+        size = (1 << self.window) - 1
+        result = INFINITY
+        offset = -1
+
+        while scalar:
+            digit = scalar & size
+
+            if digit:
+                x, y = self.points.coordinates(offset + digit)
+
+                if x is not None:
+                    result = _jacobian_add(result, (x, y, 1), a, p)
+
+            scalar >>= self.window
+            offset += size
+
+        return EllipticalPoint.from_jacobian(result, self.point.curve)
+
+    def save(self, path: str):
+        curve = self.point.curve
+
+        with open(path, "w") as file:
+            json.dump({"a": curve.a, "b": curve.b, "p": curve.p, "x": self.point.x, "y": self.point.y,
+                       "window": self.window, "xs": self.points.xs.hex(), "ys": self.points.ys.hex()}, file)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as file:
+            data = json.load(file)
+
+        curve = EllipticalCurve(data["a"], data["b"], data["p"])
+        points = PointArray(curve)
+        points.xs.extend(bytes.fromhex(data["xs"]))
+        points.ys.extend(bytes.fromhex(data["ys"]))
+
+        return cls(EllipticalPoint(data["x"], data["y"], curve), data["window"], points).register()
+
+
+class PointArray:
+    """Points of one curve as two columns of fixed-width big-endian coordinates, width bytes per coordinate (64 bytes
+    per secp256k1 point) instead of an object per point. The point at infinity is stored with every x byte set to
+    0xFF, which is not a field element since 2^(8 * width) - 1 is never a prime."""
+    __slots__ = ("curve", "width", "xs", "ys")
+
+    def __init__(self, curve: EllipticalCurve, points=()):
+        self.curve = curve
+        self.width = (curve.p.bit_length() + 7) // 8
+        self.xs = bytearray()
+        self.ys = bytearray()
+        self.extend(points)
+
+    def __len__(self):
+        return len(self.xs) // self.width
+
+    def __getitem__(self, i: int) -> EllipticalPoint:
+        x, y = self.coordinates(i)
+
+        return PointAtInfinity(self.curve) if x is None else EllipticalPoint(x, y, self.curve)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return f"PointArray({len(self)} points, {len(self.xs) + len(self.ys)} bytes)"
+
+    def append(self, point: EllipticalPoint):
+        if point.x is None:
+            self.xs += b"\xff" * self.width
+            self.ys += bytes(self.width)
+        else:
+            self.xs += point.x.to_bytes(self.width, "big")
+            self.ys += point.y.to_bytes(self.width, "big")
+
+    def extend(self, points):
+        for point in points:
+            self.append(point)
+
+    def coordinates(self, i: int) -> tuple[int | None, int | None]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        start = i * self.width
+        x = int.from_bytes(self.xs[start:start + self.width], "big")
+
+        if x >= self.curve.p:
+            return None, None
+
+        return x, int.from_bytes(self.ys[start:start + self.width], "big")
+
 
 class PointAtInfinity(EllipticalPoint):
+    __slots__ = ()
+
     def __init__(self, curve):
         super().__init__(None, None, curve)
 
+    def __reduce__(self):
+        return PointAtInfinity, (self.curve,)
+
     def __repr__(self):
         return "O"
 
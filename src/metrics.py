@@ -0,0 +1,71 @@
+"""Opt-in counters and timers for the hot paths of aes128, elliptical and utils. Call sites check metrics.enabled
+before doing anything, so leaving it off costs one attribute lookup. Work done in pool workers is counted in those
+processes, not in the caller."""
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+enabled = False
+counters = {}
+timers = {}
+_lock = Lock()
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def add_time(name: str, seconds: float):
+    with _lock:
+        calls, total = timers.get(name, (0, 0.0))
+        timers[name] = (calls + 1, total + seconds)
+
+
+def timed(name: str):
+    """Decorator recording the calls and the time spent in the function while metrics are enabled."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            start = perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                add_time(name, perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {"counters": dict(counters),
+                "timers": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in timers.items()}}
+
+
+def reset():
+    with _lock:
+        counters.clear()
+        timers.clear()
+
+
+@contextmanager
+def collect():
+    """Enables metrics from a clean slate for the block, the dict it yields is filled with the snapshot on exit."""
+    global enabled
+    previous = enabled
+    reset()
+    enabled = True
+    report = {}
+
+    try:
+        yield report
+    finally:
+        enabled = previous
+        report.update(snapshot())
@@ -1,7 +1,19 @@
+import random
+from functools import lru_cache
+from math import gcd, isqrt
+import metrics
+
+
 class MissingPublicKeyError(Exception):
     pass
 
 
+FACTOR_CACHE_SIZE = 4096
+SIEVE_LIMIT = 1 << 16
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MILLER_RABIN_LIMIT = 3317044064679887385961981
+
+
 def extended_gcd(a: int, b: int) -> tuple[int, int, int]:
     if a == 0:
         return b, 0, 1
@@ -10,28 +22,210 @@ def extended_gcd(a: int, b: int) -> tuple[int, int, int]:
         return g, y - (b // a) * x, x
 
 
-def prime_factors(n):
-    """https://stackoverflow.com/a/22808285"""
-    i = 2
+def small_primes(limit: int) -> tuple[int, ...]:
+    """https://en.wikipedia.org/wiki/Sieve_of_Eratosthenes"""
+    sieve = bytearray([1]) * limit
+    sieve[:2] = b"\x00\x00"
+
+    for i in range(2, isqrt(limit - 1) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+
+    return tuple(i for i, prime in enumerate(sieve) if prime)
+
+
+SMALL_PRIMES = small_primes(SIEVE_LIMIT)
+
+
+def is_prime(n: int) -> bool:
+    """https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test#Testing_against_small_sets_of_bases
+    Deterministic below MILLER_RABIN_LIMIT with these bases, Baillie-PSW (base 2 and a strong Lucas test) above,
+    which has no known counterexample."""
+    if n < 2:
+        return False
+
+    for base in MILLER_RABIN_BASES:
+        if n % base == 0:
+            return n == base
+
+    if n < MILLER_RABIN_LIMIT:
+        return all(is_strong_probable_prime(n, base) for base in MILLER_RABIN_BASES)
+
+    return is_strong_probable_prime(n, 2) and is_strong_lucas_probable_prime(n)
+
+
+def is_strong_probable_prime(n: int, base: int) -> bool:
+    d, s = n - 1, 0
+
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    x = pow(base, d, n)
+
+    if x == 1 or x == n - 1:
+        return True
+
+    for _ in range(s - 1):
+        x = x * x % n
+
+        if x == n - 1:
+            return True
+
+    return False
+
+
+def jacobi_symbol(a: int, n: int) -> int:
+    """https://en.wikipedia.org/wiki/Jacobi_symbol#Calculating_the_Jacobi_symbol"""
+    a %= n
+    result = 1
+
+    while a:
+        while a % 2 == 0:
+            a //= 2
+
+            if n % 8 in (3, 5):
+                result = -result
+
+        a, n = n, a
+
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+
+        a %= n
+
+    return result if n == 1 else 0
+
+
+def is_strong_lucas_probable_prime(n: int) -> bool:
+    """https://en.wikipedia.org/wiki/Lucas_pseudoprime#Strong_Lucas_pseudoprimes
+    Selfridge parameters: the first D in 5, -7, 9, -11... with (D/n) = -1, P = 1 and Q = (1 - D) / 4. n is odd."""
+    if isqrt(n) ** 2 == n:
+        return False
+
+    d = 5
+
+    while (symbol := jacobi_symbol(d, n)) != -1:
+        if symbol == 0 and abs(d) != n:
+            return False
+
+        d = -d - 2 if d > 0 else -d + 2
+
+    q = (1 - d) // 4
+    k, s = n + 1, 0
+
+    while k % 2 == 0:
+        k //= 2
+        s += 1
+
+    u, v, qk = 1, 1, q % n
+
+    for bit in bin(k)[3:]:
+        u, v, qk = u * v % n, (v * v - 2 * qk) % n, qk * qk % n
+
+        if bit == "1":
+            u, v = u + v, d * u + v
+            u, v = (u + n if u % 2 else u) // 2 % n, (v + n if v % 2 else v) // 2 % n
+            qk = qk * q % n
+
+    if u == 0 or v == 0:
+        return True
+
+    for _ in range(s - 1):
+        v, qk = (v * v - 2 * qk) % n, qk * qk % n
+
+        if v == 0:
+            return True
+
+    return False
+
+
+def pollard_brent(n: int) -> int:
+    """https://maths-people.anu.edu.au/~brent/pd/rpb051i.pdf
+    A non trivial factor of the composite n, the gcd is only taken every m steps."""
+    if metrics.enabled:
+        metrics.count("utils.pollard_brent")
+
+    if n % 2 == 0:
+        return 2
+
+    m = 128
+
+    while True:
+        y, c = random.randrange(1, n), random.randrange(1, n)
+        g = r = q = 1
+
+        while g == 1:
+            x = y
+
+            for _ in range(r):
+                y = (y * y + c) % n
+
+            k = 0
+
+            while k < r and g == 1:
+                ys = y
+
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+
+                g = gcd(q, n)
+                k += m
+
+            r *= 2
+
+        if g == n:
+            g = 1
+
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+
+        if g != n:
+            return g
+
+
+@lru_cache(maxsize=FACTOR_CACHE_SIZE)
+@metrics.timed("utils.factorize")
+def factorize(n: int) -> tuple[int, ...]:
+    """Trial division by the sieved primes, then Miller-Rabin and Pollard-Brent on what is left."""
     factors = []
 
-    while i * i <= n:
-        if n % i:
-            i += 1
+    if n < 2:
+        return ()
+
+    for prime in SMALL_PRIMES:
+        if prime * prime > n:
+            break
+
+        while n % prime == 0:
+            n //= prime
+            factors.append(prime)
+
+    composites = [n] if n > 1 else []
+
+    while composites:
+        n = composites.pop()
+
+        if is_prime(n):
+            factors.append(n)
         else:
-            n //= i
-            factors.append(i)
-    if n > 1:
-        factors.append(n)
+            factor = pollard_brent(n)
+            composites += [factor, n // factor]
 
-    return factors
+    return tuple(sorted(factors))
+
+
+def prime_factors(n):
+    return list(factorize(n))
 
 
 def phi(n):
     """https://stackoverflow.com/a/52263174"""
     totient = n
 
-    for factor in prime_factors(n):
+    for factor in set(factorize(n)):
         totient -= totient // factor
 
     return totient
@@ -44,9 +238,40 @@ def coefficient_egcd_mod_p(e, p):
 
 
 def inverse_mod(e, p):
+    if metrics.enabled:
+        metrics.count("utils.inverse_mod")
+
     return pow(e, p - 2, p)
 
 
+def batch_inverse_mod(values, p):
+    """https://en.wikipedia.org/wiki/Modular_multiplicative_inverse#Multiple_inverses
+    One inversion and 3(n - 1) multiplications, values that are 0 mod p get 0 like in inverse_mod."""
+    if metrics.enabled:
+        metrics.count("utils.batch_inverse_mod")
+
+    prefixes = []
+    product = 1
+
+    for value in values:
+        prefixes.append(product)
+
+        if value % p:
+            product = product * value % p
+
+    inverse = inverse_mod(product, p)
+    inverses = [0] * len(prefixes)
+
+    for i in reversed(range(len(prefixes))):
+        value = values[i] % p
+
+        if value:
+            inverses[i] = inverse * prefixes[i] % p
+            inverse = inverse * value % p
+
+    return inverses
+
+
 class Person:
     public_key = {}
     private_key = {}
@@ -70,5 +295,15 @@ class Person:
         if not self.public_key:
             raise MissingPublicKeyError
 
-        self.private_key["e"] = self.public_key["e"]
-        self.private_key["d"] = coefficient_egcd_mod_p(self.public_key["e"], phi(self.public_key["n"]))
+        e, n = self.public_key["e"], self.public_key["n"]
+        factors = prime_factors(n)
+        self.private_key.clear()
+        self.private_key["e"] = e
+
+        if len(factors) != 2 or factors[0] == factors[1]:
+            self.private_key["d"] = coefficient_egcd_mod_p(e, phi(n))
+            return
+
+        q, p = factors
+        d = coefficient_egcd_mod_p(e, (p - 1) * (q - 1))
+        self.private_key.update(d=d, p=p, q=q, dp=d % (p - 1), dq=d % (q - 1), q_inv=inverse_mod(q, p))